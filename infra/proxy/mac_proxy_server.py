@@ -9,6 +9,11 @@ import socket
 import ssl
 import select
 import http.client
+import json
+import time
+import itertools
+import ipaddress
+from collections import deque
 
 # List of domains that should be proxied through the tunnel
 # All other domains will be connected to directly
@@ -20,9 +25,49 @@ PROXY_DOMAINS = [
     # Add any other domains you want to proxy here
 ]
 
+# Tests tag their requests with this header, requests without it are keyed by client IP
+CORRELATION_HEADER = 'X-Correlation-ID'
+# Local endpoint serving the recent request traces to loopback clients only, requests to it aren't proxied
+TRACE_PATH = '/__traces'
+
+
+class TraceBuffer:
+    """Ring buffer of the most recent request traces, safe to use from the handler threads"""
+
+    def __init__(self, size=2000):
+        self.traces = deque(maxlen=size)
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def add(self, trace):
+        with self.lock:
+            trace['id'] = next(self.ids)
+            self.traces.append(trace)
+
+    def query(self, since=None, correlation_id=None, limit=None):
+        """Traces still open or ended after since (epoch seconds), oldest first"""
+        with self.lock:
+            traces = list(self.traces)
+        if since is not None:
+            traces = [t for t in traces if t['ended_at'] is None or t['ended_at'] >= since]
+        if correlation_id:
+            traces = [t for t in traces if t['correlation_id'] == correlation_id]
+        if limit:
+            traces = traces[-limit:]
+        # Copies, a trace in progress is still being updated by its handler thread
+        return [{k: v for k, v in t.items() if not k.startswith('_')} for t in traces]
+
+
 class ProxyHandler(http.server.BaseHTTPRequestHandler):
     def do_GET(self):
         """Handle GET requests by forwarding them through the tunnel"""
+        if self.path.startswith(TRACE_PATH):
+            # The proxy listens on all interfaces, traces hold URLs and timings of everyone's requests
+            if not ipaddress.ip_address(self.client_address[0]).is_loopback:
+                self.send_error(403, "Traces are only served to local clients")
+                return
+            self._serve_traces()
+            return
         print(f"GET request to {self.path}")
         self._process_request()
         
@@ -55,6 +100,60 @@ class ProxyHandler(http.server.BaseHTTPRequestHandler):
         print(f"OPTIONS request to {self.path}")
         self._process_request()
         
+    def _serve_traces(self):
+        """Return the buffered traces as JSON, filtered by ?since=<epoch>&correlation_id=&limit="""
+        params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        try:
+            since = float(params['since'][0]) if 'since' in params else None
+            limit = int(params['limit'][0]) if 'limit' in params else None
+        except ValueError as e:
+            self.send_error(400, f"since must be epoch seconds and limit an integer ({e})")
+            return
+        correlation_id = params.get('correlation_id', [None])[0]
+        body = json.dumps(self.server.traces.query(since, correlation_id, limit)).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_trace(self, target, route):
+        """Open a trace and put it in the buffer right away, it's filled in as the request goes"""
+        trace = {
+            'id': None,
+            # Without the header (always the case inside CONNECT tunnels) the client IP, the same for all its connections
+            'correlation_id': self.headers.get(CORRELATION_HEADER) or self.client_address[0],
+            'client': self.client_address[0],
+            'client_port': self.client_address[1],
+            'method': self.command,
+            'target': target,
+            'route': route,
+            'status': None,
+            'started_at': time.time(),
+            'ended_at': None,
+            'connect_ms': None,
+            'ttfb_ms': None,
+            'transfer_ms': None,
+            'total_ms': None,
+            'bytes_up': 0,
+            'bytes_down': 0,
+            'error': None,
+            'parent': None,  # CONNECT trace id of an exchange inside a tunnel
+            '_t0': time.perf_counter(),
+        }
+        self.server.traces.add(trace)
+        return trace
+
+    @staticmethod
+    def _elapsed_ms(trace, since=None):
+        return round((time.perf_counter() - (since if since is not None else trace['_t0'])) * 1000, 2)
+
+    def _end_trace(self, trace, status=None, error=None):
+        trace['status'] = status if status is not None else trace['status']
+        trace['error'] = error or trace['error']
+        trace['total_ms'] = self._elapsed_ms(trace)
+        trace['ended_at'] = time.time()
+
     def do_CONNECT(self):
         """Handle HTTPS CONNECT requests"""
         host_port = self.path.split(':')
@@ -78,6 +177,7 @@ class ProxyHandler(http.server.BaseHTTPRequestHandler):
             self._direct_connect(host, port)
             return
         
+        trace = self._start_trace(f"{host}:{port}", 'tunnel')
         try:
             # Try to forward through tunnel first
             tunnel_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -86,32 +186,38 @@ class ProxyHandler(http.server.BaseHTTPRequestHandler):
             try:
                 print(f"Attempting to connect to tunnel at localhost:{self.server.tunnel_port}")
                 tunnel_socket.connect(('localhost', self.server.tunnel_port))
+                trace['connect_ms'] = self._elapsed_ms(trace)
                 print(f"Successfully connected to tunnel for {host}:{port}")
                 
                 # Tell the client we're ready to tunnel
                 self.send_response(200, 'Connection Established')
                 self.send_header('Connection', 'close')
                 self.end_headers()
+                trace['status'] = 200
                 
                 # Create a thread to forward data between client and tunnel
-                self._tunnel_data(self.connection, tunnel_socket)
+                self._tunnel_data(self.connection, tunnel_socket, trace)
                 
             except socket.timeout:
                 print(f"Timeout connecting to tunnel at localhost:{self.server.tunnel_port}")
+                self._end_trace(trace, 504, "tunnel connection timeout")
                 self.send_error(504, f"Tunnel connection timeout")
                 return
             except ConnectionRefusedError:
                 print(f"Connection refused to tunnel at localhost:{self.server.tunnel_port}")
                 print(f"Is the SSH tunnel established from Windows to Mac?")
+                self._end_trace(trace, 502, "tunnel connection refused")
                 self.send_error(502, f"Cannot connect to tunnel - connection refused")
                 return
                 
         except Exception as e:
             print(f"CONNECT error: {e}")
+            self._end_trace(trace, 500, str(e))
             self.send_error(500, f"CONNECT error: {str(e)}")
     
     def _direct_connect(self, host, port):
         """Create a direct connection to the target host for reCAPTCHA domains"""
+        trace = self._start_trace(f"{host}:{port}", 'direct')
         try:
             # Create a socket to the actual target server
             target_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -119,33 +225,45 @@ class ProxyHandler(http.server.BaseHTTPRequestHandler):
             
             print(f"Opening direct connection to {host}:{port}")
             target_socket.connect((host, port))
+            trace['connect_ms'] = self._elapsed_ms(trace)
             print(f"Successfully connected directly to {host}:{port}")
             
             # Tell the client we're ready to tunnel
             self.send_response(200, 'Connection Established')
             self.send_header('Connection', 'close')
             self.end_headers()
+            trace['status'] = 200
             
             # Create a thread to forward data between client and target
-            self._tunnel_data(self.connection, target_socket)
+            self._tunnel_data(self.connection, target_socket, trace)
             
         except socket.timeout:
             print(f"Timeout connecting directly to {host}:{port}")
+            self._end_trace(trace, 504, "direct connection timeout")
             self.send_error(504, f"Direct connection timeout")
         except ConnectionRefusedError:
             print(f"Connection refused when connecting directly to {host}:{port}")
+            self._end_trace(trace, 502, "direct connection refused")
             self.send_error(502, f"Cannot connect directly - connection refused")
         except Exception as e:
             print(f"Direct connection error: {e}")
+            self._end_trace(trace, 500, str(e))
             self.send_error(500, f"Direct connection error: {str(e)}")
     
-    def _tunnel_data(self, client_conn, tunnel_conn):
-        """Forward data between client and tunnel connections"""
+    def _tunnel_data(self, client_conn, tunnel_conn, trace=None):
+        """Forward data between client and tunnel connections.
+
+        With a trace, every exchange (client bytes, then the upstream answer) in
+        the tunnel gets its own child trace: TTFB is the first upstream byte after
+        the client's, transfer time runs from there to the last upstream byte.
+        """
         sockets = [client_conn, tunnel_conn]
         print("Starting data tunneling between client and proxy")
         
         client_bytes = 0
         tunnel_bytes = 0
+        exchange = None
+        first_down = None
         
         try:
             while True:
@@ -178,11 +296,34 @@ class ProxyHandler(http.server.BaseHTTPRequestHandler):
                         if sock is client_conn:
                             print(f"Client → Tunnel: {len(data)} bytes")
                             client_bytes += len(data)
+                            if trace is not None:
+                                if exchange is None or exchange['bytes_down']:
+                                    # Client speaks again after an answer, a new exchange starts
+                                    if exchange is not None:
+                                        self._end_trace(exchange)
+                                    exchange = self._start_trace(trace['target'], trace['route'])
+                                    exchange['method'] = 'EXCHANGE'
+                                    exchange['parent'] = trace['id']
+                                exchange['bytes_up'] += len(data)
+                                trace['bytes_up'] = client_bytes
                             tunnel_conn.sendall(data)
                         else:
                             print(f"Tunnel → Client: {len(data)} bytes")
                             tunnel_bytes += len(data)
                             client_conn.sendall(data)
+                            if trace is not None:
+                                now = time.perf_counter()
+                                if exchange is not None:
+                                    if exchange['ttfb_ms'] is None:
+                                        exchange['ttfb_ms'] = self._elapsed_ms(exchange)
+                                        exchange['_first_down'] = now
+                                    exchange['transfer_ms'] = self._elapsed_ms(exchange, exchange['_first_down'])
+                                    exchange['bytes_down'] += len(data)
+                                if first_down is None:
+                                    first_down = now
+                                    trace['ttfb_ms'] = self._elapsed_ms(trace)
+                                trace['transfer_ms'] = self._elapsed_ms(trace, first_down)
+                                trace['bytes_down'] = tunnel_bytes
                             
                     except socket.error as e:
                         print(f"Socket error during tunneling: {e}")
@@ -192,6 +333,10 @@ class ProxyHandler(http.server.BaseHTTPRequestHandler):
                         return
         finally:
             print(f"Tunnel closed. Total bytes: Client→Tunnel: {client_bytes}, Tunnel→Client: {tunnel_bytes}")
+            if exchange is not None:
+                self._end_trace(exchange)
+            if trace is not None:
+                self._end_trace(trace)
         
         # Close both sockets
         try:
@@ -220,11 +365,15 @@ class ProxyHandler(http.server.BaseHTTPRequestHandler):
             self._direct_http_request(post_data)
             return
             
+        trace = self._start_trace(url, 'tunnel')
+        trace['bytes_up'] = len(post_data or b'')
         try:
             print(f"Forwarding {self.command} request to {url} via tunnel on port {self.server.tunnel_port}")
             
             # Connect to the tunnel
             conn = http.client.HTTPConnection('localhost', self.server.tunnel_port, timeout=30)
+            conn.connect()
+            trace['connect_ms'] = self._elapsed_ms(trace)
             
             # Forward the request with the same headers and body
             headers = {}
@@ -242,10 +391,15 @@ class ProxyHandler(http.server.BaseHTTPRequestHandler):
                 
                 # Get the response from the tunnel
                 response = conn.getresponse()
+                trace['ttfb_ms'] = self._elapsed_ms(trace)
+                trace['status'] = response.status
                 print(f"Received response: {response.status} {response.reason} for {url}")
                 
                 # Read the response body
+                first_byte = time.perf_counter()
                 response_body = response.read()
+                trace['transfer_ms'] = self._elapsed_ms(trace, first_byte)
+                trace['bytes_down'] = len(response_body)
                 
                 # Forward the response back to the client
                 self.send_response(response.status, response.reason)
@@ -265,15 +419,20 @@ class ProxyHandler(http.server.BaseHTTPRequestHandler):
                 
             except http.client.HTTPException as he:
                 print(f"HTTP error forwarding request: {he}")
+                self._end_trace(trace, 502, str(he))
                 self.send_error(502, f"HTTP error: {str(he)}")
             finally:
                 conn.close()
+                if trace['ended_at'] is None:
+                    self._end_trace(trace)
             
         except socket.error as se:
             print(f"Socket error processing request: {se}")
+            self._end_trace(trace, 504, str(se))
             self.send_error(504, f"Gateway Timeout: {str(se)}")
         except Exception as e:
             print(f"Error processing request: {e}")
+            self._end_trace(trace, 500, str(e))
             self.send_error(500, f"Error: {str(e)}")
             self.end_headers()
             self.wfile.write(str(e).encode())
@@ -288,6 +447,8 @@ class ProxyHandler(http.server.BaseHTTPRequestHandler):
             path += '?' + parsed_url.query
             
         print(f"Direct HTTP connection for: {host} ({self.command})")
+        trace = self._start_trace(self.path, 'direct')
+        trace['bytes_up'] = len(post_data or b'')
         
         try:
             # Create the appropriate connection based on the protocol
@@ -295,6 +456,8 @@ class ProxyHandler(http.server.BaseHTTPRequestHandler):
                 conn = http.client.HTTPSConnection(host, timeout=30)
             else:
                 conn = http.client.HTTPConnection(host, timeout=30)
+            conn.connect()
+            trace['connect_ms'] = self._elapsed_ms(trace)
                 
             # Prepare headers - remove hop-by-hop headers
             headers = {}
@@ -312,10 +475,15 @@ class ProxyHandler(http.server.BaseHTTPRequestHandler):
             
             # Get the response
             response = conn.getresponse()
+            trace['ttfb_ms'] = self._elapsed_ms(trace)
+            trace['status'] = response.status
             print(f"Received direct response: {response.status} {response.reason} for {self.path}")
             
             # Read response body
+            first_byte = time.perf_counter()
             response_body = response.read()
+            trace['transfer_ms'] = self._elapsed_ms(trace, first_byte)
+            trace['bytes_down'] = len(response_body)
             
             # Forward response to client
             self.send_response(response.status, response.reason)
@@ -334,16 +502,21 @@ class ProxyHandler(http.server.BaseHTTPRequestHandler):
                 
         except http.client.HTTPException as he:
             print(f"HTTP error in direct connection: {he}")
+            self._end_trace(trace, 502, str(he))
             self.send_error(502, f"HTTP error: {str(he)}")
         except socket.error as se:
             print(f"Socket error in direct connection: {se}")
+            self._end_trace(trace, 504, str(se))
             self.send_error(504, f"Gateway Timeout: {str(se)}")
         except Exception as e:
             print(f"Error in direct connection: {e}")
+            self._end_trace(trace, 500, str(e))
             self.send_error(500, f"Error: {str(e)}")
         finally:
             if 'conn' in locals():
                 conn.close()
+            if trace['ended_at'] is None:
+                self._end_trace(trace)
 
 def check_tunnel(tunnel_port):
     """Check if tunnel is accessible"""
@@ -359,12 +532,13 @@ def check_tunnel(tunnel_port):
         print(f"Error checking tunnel: {e}")
         return False
 
-def run_server(listen_port, tunnel_port):
+def run_server(listen_port, tunnel_port, trace_size=2000):
     class ThreadedHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
         pass
     
     server = ThreadedHTTPServer(("0.0.0.0", listen_port), ProxyHandler)
     server.tunnel_port = tunnel_port
+    server.traces = TraceBuffer(trace_size)
     
     # Check if tunnel is accessible
     tunnel_available = check_tunnel(tunnel_port)
@@ -377,6 +551,7 @@ def run_server(listen_port, tunnel_port):
         print(f"Tunnel connection verified at localhost:{tunnel_port}")
     
     print(f"Starting proxy server on port {listen_port}, forwarding to tunnel on port {tunnel_port}")
+    print(f"Request traces of the last {trace_size} requests at http://localhost:{listen_port}{TRACE_PATH}")
     try:
         server.serve_forever()
     except KeyboardInterrupt:
@@ -387,10 +562,11 @@ def main():
     parser = argparse.ArgumentParser(description="Mac proxy server for mitmproxy tunnel")
     parser.add_argument("--listen-port", type=int, default=8000, help="Port to listen on")
     parser.add_argument("--tunnel-port", type=int, default=8080, help="Port for the SSH tunnel")
+    parser.add_argument("--trace-size", type=int, default=2000, help="Number of request traces kept for tests to query")
     
     args = parser.parse_args()
     
-    run_server(args.listen_port, args.tunnel_port)
+    run_server(args.listen_port, args.tunnel_port, args.trace_size)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
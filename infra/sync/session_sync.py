@@ -0,0 +1,485 @@
+# session_sync.py
+"""
+Bulk sync of capture sessions and test_results/run_* folders off the lab hosts.
+
+Each session folder is packed into large gzip'd tar chunks named by their
+sha256. The receiver is asked which chunks it already has (and how far it got
+with interrupted ones), only the rest is uploaded, resuming at the receiver's
+offset, over several parallel streams. The manifest goes last and tells the
+receiver which files came in which chunk.
+
+    python session_sync.py serve --root /data/hot-sessions --port 8765 --extract
+    python session_sync.py push streamer/capture_session streamer/test_results --url http://localhost:8765
+"""
+import argparse
+import gzip
+import hashlib
+import http.client
+import http.server
+import json
+import os
+import shutil
+import socket
+import socketserver
+import tarfile
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Packed chunks and the index of what was packed, kept between runs so nothing is packed twice
+CACHE_DIR = os.environ.get("HOT_SYNC_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "hot-sync"))
+# Shared secret sent as X-Sync-Token, checked by the receiver when it has one
+TOKEN = os.environ.get("HOT_SYNC_TOKEN")
+CHUNK_SIZE = 64 * 1024 * 1024  # Target uncompressed bytes per chunk
+PIECE_SIZE = 8 * 1024 * 1024  # Bytes per PUT, an interruption loses at most one piece
+COMPRESS_LEVEL = 3  # Screenshots are already compressed, logs still shrink a lot at a low level
+
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def find_sessions(roots):
+    """Session units as (name, base, files): every sub folder of a root, loose files of a root as one more unit"""
+    sessions = []
+    for root in roots:
+        root = os.path.abspath(root)
+        base = os.path.dirname(root)
+        loose = []
+        for entry in sorted(os.listdir(root)):
+            path = os.path.join(root, entry)
+            if os.path.isdir(path):
+                files = []
+                for dirpath, dirnames, filenames in os.walk(path):
+                    dirnames.sort()
+                    files.extend(os.path.join(dirpath, name) for name in sorted(filenames))
+                if files:
+                    sessions.append((os.path.relpath(path, base).replace(os.sep, "/"), base, files))
+            elif os.path.isfile(path):
+                loose.append(path)
+        if loose:
+            sessions.append((os.path.relpath(root, base).replace(os.sep, "/"), base, loose))
+    return sessions
+
+
+def plan_chunks(sessions, chunk_size=CHUNK_SIZE, level=COMPRESS_LEVEL):
+    """Split each session into file groups of about chunk_size, boundaries only depend on the session itself"""
+    chunks = []
+    for name, base, files in sessions:
+        group, group_bytes = [], 0
+        for path in files:
+            st = os.stat(path)
+            entry = {"path": os.path.relpath(path, base).replace(os.sep, "/"), "size": st.st_size,
+                     "mtime": int(st.st_mtime), "_abs": path}
+            if group and group_bytes + st.st_size > chunk_size:
+                chunks.append({"session": name, "files": group})
+                group, group_bytes = [], 0
+            group.append(entry)
+            group_bytes += st.st_size
+        if group:
+            chunks.append({"session": name, "files": group})
+    for chunk in chunks:
+        # Same files, sizes, mtimes and level -> same key, the index maps it to the packed hash
+        listing = [(f["path"], f["size"], f["mtime"]) for f in chunk["files"]]
+        chunk["key"] = hashlib.sha256(json.dumps([listing, level]).encode()).hexdigest()
+    return chunks
+
+
+def pack_chunk(chunk, out_path, level=COMPRESS_LEVEL):
+    """Write the chunk as a deterministic tar.gz: sorted members, fixed owners and modes, no gzip timestamp"""
+    with open(out_path, "wb") as raw:
+        with gzip.GzipFile(filename="", fileobj=raw, mode="wb", compresslevel=level, mtime=0) as gz:
+            with tarfile.open(fileobj=gz, mode="w|", format=tarfile.GNU_FORMAT) as tar:
+                for entry in chunk["files"]:
+                    info = tarfile.TarInfo(entry["path"])
+                    info.size = entry["size"]
+                    info.mtime = entry["mtime"]
+                    info.mode = 0o644
+                    with open(entry["_abs"], "rb") as f:
+                        tar.addfile(info, f)
+    return _sha256_file(out_path), os.path.getsize(out_path)
+
+
+class ChunkIndex:
+    """chunk key -> (sha256, size) of what was packed before, saved after every chunk"""
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, "index.json")
+        self.spool_dir = os.path.join(cache_dir, "spool")
+        self.lock = threading.Lock()
+        os.makedirs(self.spool_dir, exist_ok=True)
+        # Half packed chunks of a run that was killed, an hour old so a concurrent run isn't hit
+        for name in os.listdir(self.spool_dir):
+            path = os.path.join(self.spool_dir, name)
+            if name.endswith(".tmp") and time.time() - os.path.getmtime(path) > 3600:
+                os.remove(path)
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.entries = json.load(f)
+
+    def spool_path(self, sha):
+        return os.path.join(self.spool_dir, f"{sha}.tar.gz")
+
+    def get(self, key):
+        with self.lock:
+            return self.entries.get(key)
+
+    def put(self, key, sha, size):
+        with self.lock:
+            self.entries[key] = {"sha256": sha, "size": size}
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir)
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp, self.path)
+
+
+class SyncClient:
+    """Packs and uploads chunks to a receiver, one keep-alive connection per stream"""
+
+    def __init__(self, url, streams=4, token=TOKEN, index=None, retries=5, level=COMPRESS_LEVEL):
+        parsed = urllib.parse.urlsplit(url)
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self.streams = streams
+        self.token = token
+        self.index = index or ChunkIndex()
+        self.retries = retries
+        self.level = level
+        self.local = threading.local()
+        self.stats = {"chunks_sent": 0, "chunks_skipped": 0, "chunks_resumed": 0, "chunks_packed": 0,
+                      "bytes_sent": 0, "bytes_skipped": 0}
+        self.stats_lock = threading.Lock()
+
+    def _count(self, **values):
+        with self.stats_lock:
+            for key, value in values.items():
+                self.stats[key] += value
+
+    def _request(self, method, path, body=None, headers=None):
+        """One request on this thread's connection, reconnecting once if the receiver dropped it"""
+        headers = dict(headers or {})
+        if self.token:
+            headers["X-Sync-Token"] = self.token
+        for attempt in (1, 2):
+            conn = getattr(self.local, "conn", None)
+            if conn is None:
+                conn = self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+                return response.status, json.loads(data) if data else {}
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                self.local.conn = None
+                if attempt == 2:
+                    raise
+
+    def have(self, shas):
+        """Which chunks the receiver has complete, and the offsets of partial ones"""
+        status, body = self._request("POST", "/have", json.dumps({"chunks": shas}),
+                                     {"Content-Type": "application/json"})
+        if status != 200:
+            raise RuntimeError(f"Have check failed: {status} {body}")
+        return set(body["have"]), body["partial"]
+
+    def upload(self, sha, path, offset=0):
+        """PUT the chunk in pieces from offset, following the receiver's offset on conflicts and retrying drops.
+
+        A hash mismatch of the assembled chunk restarts it from offset 0 once.
+        """
+        size = os.path.getsize(path)
+        failures = 0
+        restarted = False
+        with open(path, "rb") as f:
+            while offset < size:
+                f.seek(offset)
+                piece = f.read(PIECE_SIZE)
+                try:
+                    status, body = self._request("PUT", f"/chunks/{sha}", piece,
+                                                 {"X-Offset": str(offset), "X-Total": str(size),
+                                                  "Content-Type": "application/octet-stream"})
+                except (OSError, http.client.HTTPException) as e:
+                    failures += 1
+                    if failures > self.retries:
+                        raise
+                    print(f"Upload of {sha[:12]} interrupted at {offset} ({e}), retrying")
+                    time.sleep(min(2 ** failures, 30))
+                    _, partial = self.have([sha])
+                    offset = partial.get(sha, 0)
+                    continue
+                if status == 409:
+                    offset = body["offset"]  # Receiver has more (or less) than we thought
+                    continue
+                if status == 422 and not restarted:
+                    # The receiver dropped its corrupt partial copy, e.g. a resume from a stale offset
+                    print(f"Upload of {sha[:12]} arrived corrupt ({body.get('error')}), restarting it")
+                    restarted = True
+                    offset = 0
+                    continue
+                if status not in (200, 201):
+                    raise RuntimeError(f"Upload of {sha[:12]} failed: {status} {body}")
+                self._count(bytes_sent=len(piece))
+                offset += len(piece)
+                if status == 201:
+                    break
+
+    def _prepare(self, chunk):
+        """sha256 and size of a chunk, from the index or by packing it into the spool"""
+        known = self.index.get(chunk["key"])
+        if known and os.path.exists(self.index.spool_path(known["sha256"])):
+            return known["sha256"], known["size"]
+        fd, tmp = tempfile.mkstemp(dir=self.index.spool_dir, suffix=".tmp")
+        os.close(fd)
+        sha, size = pack_chunk(chunk, tmp, self.level)
+        os.replace(tmp, self.index.spool_path(sha))
+        self.index.put(chunk["key"], sha, size)
+        self._count(chunks_packed=1)
+        return sha, size
+
+    def _send(self, chunk, have, partial):
+        known = self.index.get(chunk["key"])
+        if known and known["sha256"] in have:
+            self._count(chunks_skipped=1, bytes_skipped=known["size"])
+            self._drop_spool(known["sha256"])
+            return known["sha256"]
+        sha, size = self._prepare(chunk)
+        if not known or known["sha256"] != sha:
+            # Packed in this run, so it wasn't part of the up-front check: ask about it now
+            have, partial = self.have([sha])
+        if sha in have:
+            self._count(chunks_skipped=1, bytes_skipped=size)
+        else:
+            offset = partial.get(sha, 0)
+            if offset:
+                self._count(chunks_resumed=1)
+                print(f"Resuming {sha[:12]} at {offset}/{size}")
+            self.upload(sha, self.index.spool_path(sha), offset)
+            self._count(chunks_sent=1)
+        self._drop_spool(sha)
+        return sha
+
+    def _drop_spool(self, sha):
+        # The receiver has the chunk, the spool copy isn't needed anymore
+        if os.path.exists(self.index.spool_path(sha)):
+            os.remove(self.index.spool_path(sha))
+
+    def push(self, roots, name, chunk_size=CHUNK_SIZE):
+        """Sync the sessions under roots, returns the manifest stored on the receiver"""
+        started = time.perf_counter()
+        sessions = find_sessions(roots)
+        chunks = plan_chunks(sessions, chunk_size, self.level)
+        file_count = sum(len(c["files"]) for c in chunks)
+        print(f"{len(sessions)} sessions, {file_count} files in {len(chunks)} chunks, {self.streams} streams")
+
+        # Chunks packed in earlier runs are checked up front in one request, _send asks about
+        # each chunk packed in this run (empty cache, changed sessions) once it has its hash
+        known = [self.index.get(c["key"])["sha256"] for c in chunks if self.index.get(c["key"])]
+        have, partial = self.have(known) if known else (set(), {})
+
+        with ThreadPoolExecutor(max_workers=self.streams) as pool:
+            futures = {pool.submit(self._send, chunk, have, partial): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                futures[future]["sha256"] = future.result()
+
+        manifest = {"name": name, "created_at": time.time(),
+                    "chunks": [{"sha256": c["sha256"], "session": c["session"],
+                                "files": [{k: v for k, v in f.items() if not k.startswith("_")}
+                                          for f in c["files"]]} for c in chunks]}
+        status, body = self._request("PUT", f"/manifests/{urllib.parse.quote(name)}", json.dumps(manifest),
+                                     {"Content-Type": "application/json"})
+        if status not in (200, 201):
+            raise RuntimeError(f"Manifest upload failed: {status} {body}")
+
+        elapsed = time.perf_counter() - started
+        mb = self.stats["bytes_sent"] / 1024 / 1024
+        print(f"Synced {file_count} files in {elapsed:.1f}s: {self.stats['chunks_sent']} chunks sent "
+              f"({mb:.1f} MB, {mb / elapsed if elapsed else 0:.1f} MB/s), {self.stats['chunks_skipped']} "
+              f"already on the receiver, {self.stats['chunks_resumed']} resumed")
+        return manifest
+
+
+class ReceiverHandler(http.server.BaseHTTPRequestHandler):
+    """Stand-in receiver: chunks under <root>/chunks, partial uploads under <root>/partial"""
+    protocol_version = "HTTP/1.1"  # Keep-alive, every stream keeps its connection
+
+    def log_message(self, format, *args):
+        pass  # One line per piece would drown the summary lines
+
+    def _reply(self, status, body=None):
+        data = json.dumps(body or {}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self):
+        if self.server.token and self.headers.get("X-Sync-Token") != self.server.token:
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self._reply(403, {"error": "bad token"})
+            return False
+        return True
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        if self.path != "/have":
+            self._body()
+            return self._reply(404, {"error": "not found"})
+        shas = [sha for sha in json.loads(self._body())["chunks"] if _valid_sha(sha)]
+        have = [sha for sha in shas if os.path.exists(self.server.chunk_path(sha))]
+        partial = {sha: os.path.getsize(self.server.partial_path(sha)) for sha in shas
+                   if sha not in have and os.path.exists(self.server.partial_path(sha))}
+        self._reply(200, {"have": have, "partial": partial})
+
+    def do_PUT(self):
+        if not self._authorized():
+            return
+        if self.path.startswith("/chunks/"):
+            return self._put_chunk(self.path[len("/chunks/"):])
+        if self.path.startswith("/manifests/"):
+            return self._put_manifest(urllib.parse.unquote(self.path[len("/manifests/"):]))
+        self._body()
+        self._reply(404, {"error": "not found"})
+
+    def _put_chunk(self, sha):
+        data = self._body()
+        if not _valid_sha(sha):
+            return self._reply(400, {"error": "bad chunk name"})
+        offset, total = int(self.headers["X-Offset"]), int(self.headers["X-Total"])
+        final_path, partial_path = self.server.chunk_path(sha), self.server.partial_path(sha)
+        with self.server.chunk_lock(sha):
+            if os.path.exists(final_path):
+                return self._reply(201, {"offset": total})
+            current = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+            if offset != current:
+                return self._reply(409, {"offset": current})
+            with open(partial_path, "ab") as f:
+                f.write(data)
+            current += len(data)
+            if current < total:
+                return self._reply(200, {"offset": current})
+            if _sha256_file(partial_path) != sha:
+                os.remove(partial_path)
+                return self._reply(422, {"error": "hash mismatch, upload the chunk again"})
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(partial_path, final_path)
+        self._reply(201, {"offset": current})
+
+    def _put_manifest(self, name):
+        manifest = json.loads(self._body())
+        if not name or "/" in name or name.startswith("."):
+            return self._reply(400, {"error": "bad manifest name"})
+        missing = [c["sha256"] for c in manifest["chunks"] if not os.path.exists(self.server.chunk_path(c["sha256"]))]
+        if missing:
+            return self._reply(409, {"missing": missing})
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        with open(os.path.join(self.server.root, "manifests", f"{name}_{stamp}.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+        if self.server.extract:
+            self.server.extract_chunks(name, manifest)
+        files = sum(len(c["files"]) for c in manifest["chunks"])
+        print(f"Received {name}: {len(manifest['chunks'])} chunks, {files} files")
+        self._reply(201, {"chunks": len(manifest["chunks"]), "files": files})
+
+
+def _valid_sha(sha):
+    return len(sha) == 64 and all(c in "0123456789abcdef" for c in sha)
+
+
+def _unchanged(path, entry):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return st.st_size == entry["size"] and int(st.st_mtime) == entry["mtime"]
+
+
+class ThreadedReceiver(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, root, token=None, extract=False):
+        super().__init__(address, ReceiverHandler)
+        self.root = root
+        self.token = token
+        self.extract = extract
+        self.locks = {}
+        self.locks_lock = threading.Lock()
+        for sub in ("chunks", "partial", "manifests", "files"):
+            os.makedirs(os.path.join(root, sub), exist_ok=True)
+
+    def chunk_path(self, sha):
+        return os.path.join(self.root, "chunks", sha[:2], f"{sha}.tar.gz")
+
+    def partial_path(self, sha):
+        return os.path.join(self.root, "partial", sha)
+
+    def chunk_lock(self, sha):
+        with self.locks_lock:
+            return self.locks.setdefault(sha, threading.Lock())
+
+    def extract_chunks(self, name, manifest):
+        """Unpack the chunks of a manifest to <root>/files/<name>/, members are checked to stay inside it"""
+        target = os.path.realpath(os.path.join(self.root, "files", name))
+        for chunk in manifest["chunks"]:
+            if all(_unchanged(os.path.join(target, f["path"]), f) for f in chunk["files"]):
+                continue  # Extracted by an earlier push
+            with tarfile.open(self.chunk_path(chunk["sha256"]), "r:gz") as tar:
+                for member in tar:
+                    path = os.path.realpath(os.path.join(target, member.name))
+                    if not member.isfile() or not path.startswith(target + os.sep):
+                        continue
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with tar.extractfile(member) as src, open(path, "wb") as dst:
+                        shutil.copyfileobj(src, dst)
+                    os.utime(path, (member.mtime, member.mtime))
+
+
+def run_receiver(root, port, token=None, extract=False):
+    server = ThreadedReceiver(("", port), root, token, extract)
+    print(f"Session sync receiver on port {port}, storing in {os.path.abspath(root)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down receiver")
+        server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk sync capture sessions off the lab hosts")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="Run the stand-in receiver")
+    serve.add_argument("--root", default="sync_receiver", help="Directory the receiver stores chunks in")
+    serve.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    serve.add_argument("--extract", action="store_true", help="Unpack the files of every received manifest")
+
+    push = sub.add_parser("push", help="Sync session folders to a receiver")
+    push.add_argument("roots", nargs="+", help="Folders whose sub folders are sessions (capture_session, test_results)")
+    push.add_argument("--url", default="http://localhost:8765", help="Receiver URL, e.g. through the SSH tunnel")
+    push.add_argument("--name", default=socket.gethostname(), help="Manifest name (default: host name)")
+    push.add_argument("--streams", type=int, default=4, help="Parallel upload streams")
+    push.add_argument("--chunk-mb", type=int, default=CHUNK_SIZE // 1024 // 1024, help="Target chunk size in MB")
+    push.add_argument("--level", type=int, default=COMPRESS_LEVEL, help="gzip level of the chunks")
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        run_receiver(args.root, args.port, TOKEN, args.extract)
+    else:
+        client = SyncClient(args.url, streams=args.streams, level=args.level)
+        client.push(args.roots, args.name, args.chunk_mb * 1024 * 1024)
+
+
+if __name__ == "__main__":
+    main()
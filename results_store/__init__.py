@@ -0,0 +1,19 @@
+import os
+
+from .store import RESULTS_DIR, ResultsStore, RunWriter, percentile
+
+
+def open_store(directory: str = None):
+    """Store for the writers in the test code, None when HOT_RESULTS_STORE=0"""
+    if os.environ.get("HOT_RESULTS_STORE", "1") == "0":
+        return None
+    try:
+        return ResultsStore(directory or RESULTS_DIR)
+    except Exception as e:
+        print(f"Results store unavailable: {e}")
+        return None
+
+
+def open_run(source: str, name: str, device: str = None, metadata: dict = None, **kwargs) -> RunWriter:
+    """Writer for one run, collects without storing when the store is off or unavailable"""
+    return RunWriter(open_store(), source, name, device, metadata, **kwargs)
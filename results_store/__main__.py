@@ -0,0 +1,59 @@
+import argparse
+import json
+import time
+from datetime import datetime
+
+from .store import RESULTS_DIR, ResultsStore
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m results_store",
+                                     description="Query the results of streamer, TV and web runs")
+    parser.add_argument("--dir", default=RESULTS_DIR, help="Results directory (default: HOT_RESULTS_DIR)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    runs_parser = subparsers.add_parser("runs", help="List recent runs")
+    runs_parser.add_argument("--source", choices=["streamer", "tv", "web"])
+    runs_parser.add_argument("--name")
+    runs_parser.add_argument("--days", type=int)
+    runs_parser.add_argument("--limit", type=int, default=20)
+
+    trend_parser = subparsers.add_parser("trend", help="Daily percentile of a step duration")
+    trend_parser.add_argument("step", help="Step name, e.g. app_launch or enter_credentials")
+    trend_parser.add_argument("--days", type=int, default=30)
+    trend_parser.add_argument("--percentile", "-p", type=float, default=95)
+    trend_parser.add_argument("--source", choices=["streamer", "tv", "web"])
+    trend_parser.add_argument("--name")
+    trend_parser.add_argument("--device")
+
+    show_parser = subparsers.add_parser("show", help="Print the stored data of one run")
+    show_parser.add_argument("run_id")
+
+    args = parser.parse_args()
+    store = ResultsStore(args.dir)
+    started = time.perf_counter()
+
+    if args.command == "runs":
+        since = time.time() - args.days * 86400 if args.days else None
+        for run in store.runs(args.source, args.name, since, args.limit):
+            started_at = datetime.fromtimestamp(run["started_at"]).strftime("%Y-%m-%d %H:%M:%S")
+            duration = f"{run['finished_at'] - run['started_at']:.1f}s" if run["finished_at"] else "-"
+            print(f"{started_at}  {run['run_id']}  {run['source']}/{run['name']}  "
+                  f"{run['device'] or '-'}  {run['status']}  {duration}")
+    elif args.command == "trend":
+        key = f"p{args.percentile:g}"
+        rows = store.trend(args.step, args.days, args.percentile,
+                           source=args.source, name=args.name, device=args.device)
+        print(f"{'day':<12}{'runs':>6}{'p50':>10}{key:>10}")
+        for row in rows:
+            print(f"{row['day']:<12}{row['count']:>6}{row['p50']:>10.3f}{row[key]:>10.3f}")
+        if not rows:
+            print(f"No successful '{args.step}' steps in the last {args.days} days")
+    else:
+        print(json.dumps(store.load_run(args.run_id), indent=2))
+
+    print(f"({(time.perf_counter() - started) * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
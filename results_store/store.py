@@ -0,0 +1,225 @@
+import gzip
+import json
+import math
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import closing, contextmanager
+
+RESULTS_DIR = os.environ.get(
+    "HOT_RESULTS_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "results")
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    name TEXT NOT NULL,
+    device TEXT,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    status TEXT,
+    metadata TEXT
+);
+CREATE TABLE IF NOT EXISTS steps (
+    run_id TEXT NOT NULL REFERENCES runs(run_id),
+    step TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    duration_s REAL,
+    status TEXT,
+    metrics TEXT
+);
+CREATE INDEX IF NOT EXISTS steps_by_step ON steps(step, timestamp);
+CREATE INDEX IF NOT EXISTS runs_by_source ON runs(source, name, started_at);
+"""
+
+
+def _clean(value):
+    """NaN isn't valid JSON, store it as null"""
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def percentile(values: list, pct: float):
+    """Nearest-rank percentile of values, None when empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class ResultsStore:
+    """Run and step rows in SQLite for queries, one columnar gzip JSON file per run for the full data.
+
+    Every run has a source (streamer, tv, web), a name (test or flow), an
+    optional device and steps with a timestamp, a duration and free form
+    metrics. Series too long for rows (resource samples) only go to the run file.
+    """
+
+    def __init__(self, directory: str = RESULTS_DIR):
+        self.directory = directory
+        self.runs_dir = os.path.join(directory, "runs")
+        os.makedirs(self.runs_dir, exist_ok=True)
+        self.db_path = os.path.join(directory, "results.db")
+        with closing(self._connect()) as db, db:
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        """New connection, wrap it in closing(): its own with block only commits, it never closes"""
+        db = sqlite3.connect(self.db_path, timeout=10)
+        db.execute("PRAGMA journal_mode=WAL")  # Readers don't block the writers of running tests
+        return db
+
+    def start_run(self, source: str, name: str, device: str = None, metadata: dict = None,
+                  run_id: str = None, started_at: float = None) -> "RunWriter":
+        return RunWriter(self, source, name, device, metadata, run_id, started_at)
+
+    def run_path(self, run_id: str, started_at: float) -> str:
+        day = time.strftime("%Y%m%d", time.localtime(started_at))
+        return os.path.join(self.runs_dir, day, f"{run_id}.json.gz")
+
+    def write_run(self, run: dict, steps: list, series: dict = None) -> str:
+        """Store a finished run, returns the path of its run file"""
+        with closing(self._connect()) as db, db:
+            db.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (run["run_id"], run["source"], run["name"], run.get("device"), run["started_at"],
+                 run.get("finished_at"), run.get("status"), json.dumps(run.get("metadata") or {}, default=str)))
+            db.execute("DELETE FROM steps WHERE run_id = ?", (run["run_id"],))
+            db.executemany(
+                "INSERT INTO steps VALUES (?, ?, ?, ?, ?, ?)",
+                [(run["run_id"], s["step"], s["timestamp"], _clean(s.get("duration_s")), s.get("status"),
+                  json.dumps({k: _clean(v) for k, v in (s.get("metrics") or {}).items()}, default=str))
+                 for s in steps])
+
+        columns = {name: [_clean(s.get(name)) for s in steps]
+                   for name in ("step", "timestamp", "duration_s", "status", "metrics")}
+        path = self.run_path(run["run_id"], run["started_at"])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with gzip.open(path, "wt") as f:
+            json.dump({
+                "run": run,
+                "steps": columns,
+                "series": {name: {column: [_clean(v) for v in values] for column, values in data.items()}
+                           for name, data in (series or {}).items()},
+            }, f, default=str)
+        return path
+
+    def load_run(self, run_id: str) -> dict:
+        with closing(self._connect()) as db, db:
+            row = db.execute("SELECT started_at FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if not row:
+            raise KeyError(run_id)
+        with gzip.open(self.run_path(run_id, row[0]), "rt") as f:
+            return json.load(f)
+
+    def runs(self, source: str = None, name: str = None, since: float = None, limit: int = 20) -> list:
+        query = "SELECT run_id, source, name, device, started_at, finished_at, status FROM runs WHERE 1=1"
+        params = []
+        for column, value in (("source", source), ("name", name)):
+            if value:
+                query += f" AND {column} = ?"
+                params.append(value)
+        if since:
+            query += " AND started_at >= ?"
+            params.append(since)
+        query += " ORDER BY started_at DESC LIMIT ?"
+        params.append(limit)
+        with closing(self._connect()) as db, db:
+            keys = ("run_id", "source", "name", "device", "started_at", "finished_at", "status")
+            return [dict(zip(keys, row)) for row in db.execute(query, params)]
+
+    def step_durations(self, step: str, since: float = None, source: str = None, name: str = None,
+                       device: str = None, status: str = "success") -> list:
+        """(timestamp, duration_s) of a step across runs, oldest first"""
+        query = ("SELECT s.timestamp, s.duration_s FROM steps s JOIN runs r ON r.run_id = s.run_id "
+                 "WHERE s.step = ? AND s.duration_s IS NOT NULL")
+        params = [step]
+        for column, value in (("s.timestamp >=", since), ("r.source =", source), ("r.name =", name),
+                              ("r.device =", device), ("s.status =", status)):
+            if value is not None:
+                query += f" AND {column} ?"
+                params.append(value)
+        with closing(self._connect()) as db, db:
+            return db.execute(query + " ORDER BY s.timestamp", params).fetchall()
+
+    def trend(self, step: str, days: int = 30, pct: float = 95, **filters) -> list:
+        """Per day count, median and percentile of a step duration over the last days"""
+        by_day = {}
+        for timestamp, duration in self.step_durations(step, since=time.time() - days * 86400, **filters):
+            by_day.setdefault(time.strftime("%Y-%m-%d", time.localtime(timestamp)), []).append(duration)
+        return [{"day": day, "count": len(values), "p50": percentile(values, 50), f"p{pct:g}": percentile(values, pct)}
+                for day, values in sorted(by_day.items())]
+
+
+class RunWriter:
+    """Collects the steps of one run, nothing is written until finish().
+
+    Without a store (results store turned off) steps are still collected
+    but finish() writes nothing, so writers don't need to check.
+    """
+
+    def __init__(self, store: ResultsStore, source: str, name: str, device: str = None,
+                 metadata: dict = None, run_id: str = None, started_at: float = None):
+        self.store = store
+        self.run = {
+            "run_id": run_id or str(uuid.uuid4()),
+            "source": source,
+            "name": name,
+            "device": device,
+            "started_at": started_at or time.time(),
+            "metadata": dict(metadata or {}),
+        }
+        self.steps = []
+        self.series = {}
+
+    @property
+    def run_id(self) -> str:
+        return self.run["run_id"]
+
+    def step(self, step: str, duration_s: float = None, status: str = "success", timestamp: float = None,
+             **metrics):
+        self.steps.append({"step": step, "timestamp": timestamp or time.time(), "duration_s": duration_s,
+                           "status": status, "metrics": metrics})
+
+    @contextmanager
+    def timed(self, step: str, **metrics):
+        """Record the wrapped block as a step, failed when it raises. Yields metrics to add to"""
+        started = time.perf_counter()
+        status = "failure"
+        try:
+            yield metrics
+            status = "success"
+        finally:
+            self.step(step, duration_s=round(time.perf_counter() - started, 4), status=status, **metrics)
+
+    def add_series(self, name: str, columns: dict):
+        """Columns of equal length, e.g. resource samples, kept in the run file only"""
+        self.series[name] = {column: list(values) for column, values in columns.items()}
+
+    def finish(self, status: str = None) -> str:
+        if status is None:
+            status = "failure" if any(s["status"] != "success" for s in self.steps) else "success"
+        self.run["finished_at"] = time.time()
+        self.run["status"] = status
+        if self.store is None:
+            return None
+        # Storing results must never fail the test that produced them
+        try:
+            path = self.store.write_run(self.run, self.steps, self.series)
+        except (sqlite3.Error, OSError, TypeError, ValueError) as e:
+            print(f"Could not store run {self.run_id}: {e}")
+            return None
+        print(f"Stored {self.run['source']}/{self.run['name']} run {self.run_id} in {self.store.directory}")
+        return path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish("failure" if exc_type else None)
+        return False
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Adaptive screenshot rate for capture sessions: a low base rate while the UI
+is idle that bursts to the maximum rate when consecutive frames differ a lot
+or a transition shows up in the session log, then decays back to the base
+rate step by step.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+
+try:
+    from PIL import Image, ImageChops, ImageStat
+except ImportError:  # Frame deltas need Pillow, log events still trigger bursts without it
+    Image = None
+
+# Session log lines that start a burst, the awk filter tags HOT lines with [HOT_EVENT]
+BURST_PATTERNS = {
+    'activity_start': re.compile(r'\[HOT_EVENT\].*ActivityTaskManager.*START'),
+    'window_transition': re.compile(r'WindowManagerShell.*Transition requested'),
+    'transition_ready': re.compile(r'WindowManagerShell.*onTransitionReady'),
+}
+
+
+class AdaptiveCaptureRate:
+    """Decide the interval until the next screenshot from frame deltas and log events"""
+
+    def __init__(self, base_interval=2.0, burst_interval=0.2, hold=3.0, delta_threshold=0.04,
+                 decision_log=None):
+        self.base_interval = base_interval
+        self.burst_interval = burst_interval  # The maximum rate, used while a burst is held
+        self.hold = hold  # Seconds a burst lasts after its last trigger
+        self.delta_threshold = delta_threshold  # Mean gray difference (0-1) between frames that triggers a burst
+        self.decision_log = decision_log  # JSON lines file with every rate decision
+        self.current = base_interval
+        self.burst_until = 0.0
+        self.bursts = 0
+        self.burst_frames = 0
+        self.frames = 0
+        self.last_thumb = None
+        self.last_frame_at = None
+        self.lock = threading.Lock()
+        self.wake = threading.Event()  # Set on a burst so a long base sleep ends right away
+        self.stop_event = threading.Event()
+        self.tail_thread = None
+
+    def _log(self, decision, reason, **values):
+        """Record a rate decision, printed when the mode changes and always written to the decision log"""
+        entry = {'time': round(time.time(), 3), 'decision': decision, 'reason': reason,
+                 'interval': self.current, **values}
+        if decision in ('burst', 'base'):
+            print(f"Capture rate {decision}: {reason} -> {self.current}s interval")
+        if self.decision_log:
+            with open(self.decision_log, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+
+    def trigger(self, reason, **values):
+        """Start a burst, or extend the running one"""
+        with self.lock:
+            now = time.time()
+            extending = now < self.burst_until
+            self.burst_until = now + self.hold
+            self.current = self.burst_interval
+            if not extending:
+                self.bursts += 1
+            self._log('extend' if extending else 'burst', reason, **values)
+        self.wake.set()
+
+    def next_interval(self):
+        """Interval before the next screenshot, halving the rate back towards base once the burst expired"""
+        with self.lock:
+            self.frames += 1
+            if self.current < self.base_interval:
+                self.burst_frames += 1
+            if time.time() >= self.burst_until and self.current < self.base_interval:
+                self.current = min(self.current * 2, self.base_interval)
+                self._log('base' if self.current == self.base_interval else 'decay', 'no activity')
+            return self.current
+
+    def wait(self, interval):
+        """Sleep for interval, cut short by a burst"""
+        self.wake.wait(interval)
+        self.wake.clear()
+
+    def observe_frame(self, path, taken_at):
+        """Compare a pulled screenshot with the previous one, bursts when they differ enough"""
+        if Image is None:
+            return None
+        try:
+            with Image.open(path) as img:
+                # A small gray thumbnail is enough to tell an idle menu from a transition
+                thumb = img.convert('L').reduce(16)
+        except OSError as e:
+            print(f"Frame delta skipped for {path}: {e}")
+            return None
+        with self.lock:
+            # Screenshots finish out of order on the pool, only compare forward in time
+            if self.last_frame_at is not None and taken_at <= self.last_frame_at:
+                return None
+            previous, self.last_thumb, self.last_frame_at = self.last_thumb, thumb, taken_at
+        if previous is None or previous.size != thumb.size:
+            return None
+        delta = ImageStat.Stat(ImageChops.difference(previous, thumb)).mean[0] / 255.0
+        if delta >= self.delta_threshold:
+            self.trigger('frame delta', delta=round(delta, 4), frame=os.path.basename(path))
+        return delta
+
+    def _tail_log(self, log_path):
+        """Thread function following the session log for transition lines"""
+        while not os.path.exists(log_path) and not self.stop_event.is_set():
+            self.stop_event.wait(0.1)
+        with open(log_path, errors='replace') as f:
+            f.seek(0, os.SEEK_END)
+            partial = ''
+            while not self.stop_event.is_set():
+                chunk = f.readline()
+                if not chunk:
+                    self.stop_event.wait(0.05)
+                    continue
+                partial += chunk
+                if not partial.endswith('\n'):
+                    continue  # Line still being written
+                line, partial = partial, ''
+                for name, pattern in BURST_PATTERNS.items():
+                    if pattern.search(line):
+                        self.trigger(f'log {name}', line=line.strip()[:200])
+                        break
+
+    def start(self, log_path):
+        """Start following the session log"""
+        self.stop_event.clear()
+        self.tail_thread = threading.Thread(target=self._tail_log, args=(log_path,), daemon=True)
+        self.tail_thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake.set()
+        if self.tail_thread:
+            self.tail_thread.join(timeout=2)
+
+    def summary(self):
+        return {'bursts': self.bursts, 'frames': self.frames, 'burst_frames': self.burst_frames,
+                'base_interval': self.base_interval, 'burst_interval': self.burst_interval}
@@ -14,11 +14,16 @@ import queue
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor
 
+# Shared results store at the repo root, run with the repo root on PYTHONPATH (see docs/results-store.md)
+from results_store import open_run
+
+from adaptive_capture import AdaptiveCaptureRate
+
 class LogAndScreenshotCapture:
     """Capture both logs and screenshots simultaneously"""
     
     def __init__(self, device_id=None, output_dir="capture_session", 
-                 screenshot_interval=0.2, max_duration=60):
+                 screenshot_interval=0.2, max_duration=60, golden_dir=None, adaptive=None):
         self.device_id = device_id
         self.output_dir = output_dir
         self.screenshot_interval = screenshot_interval
@@ -30,6 +35,9 @@ class LogAndScreenshotCapture:
         self.log_process = None
         self.executor = ThreadPoolExecutor(max_workers=4)
         self.pending_tasks = []
+        self.golden_dir = golden_dir  # Golden frames to match the session against, see visual_regression.py
+        self.visual_report = None
+        self.adaptive = adaptive  # AdaptiveCaptureRate, screenshot_interval is then only the burst rate
         
         # Create output directory and subdirectories
         self.screenshot_dir = os.path.join(output_dir, "screenshots")
@@ -64,6 +72,9 @@ class LogAndScreenshotCapture:
             
             # Remove from device
             self._execute_adb_command(["shell", f"rm {remote_path}"])
+
+            if self.adaptive and os.path.exists(local_path):
+                self.adaptive.observe_frame(local_path, timestamp.timestamp())
             
             print(f"Screenshot: {filename}")
             return local_path
@@ -95,14 +106,14 @@ class LogAndScreenshotCapture:
                "  if ($0 ~ /il\.net\.hot|hot|ActivityTask|input|key|touch|WebView|TvMain/i) " +
                "    print \"[HOT_EVENT] \" $0; " +
                "  else if ($0 !~ /MEDIA_SCANNER_SCAN_FILE/) " +
-               "    print $0" +
+               "    print $0; " +
+               "  fflush()" +  # Line by line, so the file can be tailed during the session
                "}'"]
         print(f"Using command: {' '.join(cmd)}")
         
         print(f"Starting log capture to {log_path}")
         self.log_process = subprocess.Popen(
             cmd,
-            shell=True,  # Using shell=True since we're using bash -c
             stdout=self.log_file,
             stderr=subprocess.STDOUT,
             text=True,
@@ -143,6 +154,12 @@ class LogAndScreenshotCapture:
             f.write(f"Session started: {self.start_time}\n")
             f.write(f"Device: {self.device_id}\n")
             f.write(f"Screenshot interval: {self.screenshot_interval} seconds\n")
+            if self.adaptive:
+                f.write(f"Adaptive: {self.adaptive.base_interval}s base, "
+                        f"{self.adaptive.burst_interval}s bursts held {self.adaptive.hold}s\n")
+        
+        if self.adaptive:
+            self.adaptive.start(os.path.join(self.output_dir, "session_logs.txt"))
         
         self.running = True
         try:
@@ -161,8 +178,11 @@ class LogAndScreenshotCapture:
                 self.pending_tasks.append(future)
                 self.screenshot_count += 1
                 
-                # Sleep for the screenshot interval
-                time.sleep(self.screenshot_interval)
+                # Sleep for the screenshot interval, or as long as the adaptive rate says
+                if self.adaptive:
+                    self.adaptive.wait(self.adaptive.next_interval())
+                else:
+                    time.sleep(self.screenshot_interval)
                 
                 # Clean up completed tasks
                 self.pending_tasks = [f for f in self.pending_tasks if not f.done()]
@@ -171,6 +191,8 @@ class LogAndScreenshotCapture:
             print("\nStopping capture session")
         finally:
             # Stop log capture
+            if self.adaptive:
+                self.adaptive.stop()
             self._stop_log_capture()
             
             self.running = False
@@ -179,10 +201,55 @@ class LogAndScreenshotCapture:
             
             print(f"Capture session completed")
             print(f"Captured {self.screenshot_count} screenshots")
+            if self.adaptive:
+                summary = self.adaptive.summary()
+                print(f"Adaptive capture: {summary['bursts']} bursts, "
+                      f"{summary['burst_frames']} of {summary['frames']} screenshots at the burst rate")
             print(f"Results saved to {os.path.abspath(self.output_dir)}")
             
             # Create an HTML index for easy viewing
             self._create_html_index()
+            self._compare_golden()
+            self._store_results()
+    
+    def _store_results(self):
+        """Record the session in the shared results store"""
+        duration = (datetime.now() - self.start_time).total_seconds()
+        metadata = {"output_dir": os.path.abspath(self.output_dir),
+                    "screenshot_interval": self.screenshot_interval}
+        adaptive = self.adaptive.summary() if self.adaptive else {}
+        if adaptive:
+            metadata["adaptive"] = adaptive
+        run = open_run("streamer", "capture_session", device=self.device_id,
+                       metadata=metadata, started_at=self.start_time.timestamp())
+        run.step("capture_session", duration_s=round(duration, 3),
+                 screenshots=self.screenshot_count,
+                 screenshots_per_s=round(self.screenshot_count / duration, 2) if duration else None,
+                 bursts=adaptive.get("bursts"), burst_screenshots=adaptive.get("burst_frames"))
+        if self.visual_report:
+            # Time until each known screen first appeared, and how many of its frames differed
+            seen = set()
+            for segment in self.visual_report['timeline']:
+                if segment['screen'] and segment['screen'] not in seen:
+                    seen.add(segment['screen'])
+                    run.step(f"screen:{segment['screen']}",
+                             duration_s=round(segment['start'] - self.start_time.timestamp(), 3),
+                             timestamp=segment['start'],
+                             differing_frames=sum(other['differing_frames'] for other in self.visual_report['timeline']
+                                                  if other['screen'] == segment['screen']))
+        run.finish()
+
+    def _compare_golden(self):
+        """Match the screenshots against the golden frames and print the screen timeline"""
+        if not self.golden_dir:
+            return
+        try:
+            from visual_regression import compare_session, print_report
+            self.visual_report = compare_session(self.screenshot_dir, self.golden_dir,
+                                                 output=os.path.join(self.output_dir, "visual_timeline.json"))
+            print_report(self.visual_report)
+        except Exception as e:
+            print(f"Visual regression failed: {e}")
     
     def _create_html_index(self):
         """Create an HTML index of screenshots with timestamps"""
@@ -236,6 +303,16 @@ if __name__ == "__main__":
                         help="Screenshot interval in seconds (default: 0.2)")
     parser.add_argument("--duration", "-t", type=int, default=60,
                         help="Maximum duration in seconds (default: 60)")
+    parser.add_argument("--golden", "-g",
+                        help="Golden frames directory to match the screenshots against after the session")
+    parser.add_argument("--adaptive", "-a", action="store_true",
+                        help="Capture at --base-interval while idle and burst to --interval on UI activity")
+    parser.add_argument("--base-interval", type=float, default=2.0,
+                        help="Adaptive idle screenshot interval in seconds (default: 2.0)")
+    parser.add_argument("--burst-hold", type=float, default=3.0,
+                        help="Seconds a burst lasts after the last frame change or log event (default: 3.0)")
+    parser.add_argument("--delta-threshold", type=float, default=0.04,
+                        help="Mean frame difference (0-1) that starts a burst (default: 0.04)")
     
     args = parser.parse_args()
     
@@ -243,12 +320,24 @@ if __name__ == "__main__":
     signal.signal(signal.SIGINT, handle_exit)
     signal.signal(signal.SIGTERM, handle_exit)
     
+    adaptive = None
+    if args.adaptive:
+        adaptive = AdaptiveCaptureRate(
+            base_interval=args.base_interval,
+            burst_interval=args.interval,
+            hold=args.burst_hold,
+            delta_threshold=args.delta_threshold,
+            decision_log=os.path.join(args.output, "capture_rate.jsonl")
+        )
+
     # Start capture session
     capture = LogAndScreenshotCapture(
         device_id=args.device,
         output_dir=args.output,
         screenshot_interval=args.interval,
-        max_duration=args.duration
+        max_duration=args.duration,
+        golden_dir=args.golden,
+        adaptive=adaptive
     )
     
     capture.capture_session()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Sample CPU, memory and frame statistics of the HOT app on the streamer while a
+test runs. All polling goes through one persistent adb shell, so a sample costs
+a round trip on an open connection instead of new adb processes. dumpsys is
+heavy on the device itself, so meminfo/gfxinfo only run every few samples.
+"""
+
+import subprocess
+import threading
+import time
+import os
+import csv
+import json
+import argparse
+import re
+from array import array
+
+HOT_PACKAGE = "il.net.hot.hot"
+SAMPLE_END_MARKER = "__HOT_SAMPLE_END__"
+
+PSS_PATTERN = re.compile(r"TOTAL(?: PSS)?:?\s+(\d+)")
+
+# Columns of the time series, all timestamps are host time.time() so samples
+# line up with log event and frame timestamps taken on the same machine
+COLUMNS = ["timestamp", "cpu_percent", "rss_kb", "pss_kb", "frames_rendered", "janky_frames"]
+
+
+class DeviceResourceSampler:
+    """Poll resource usage of an app over a single adb shell at a fixed rate"""
+
+    def __init__(self, device_id=None, package=HOT_PACKAGE, interval=0.5, dumpsys_every=10):
+        self.device_id = device_id
+        self.package = package
+        self.interval = interval
+        self.dumpsys_every = dumpsys_every  # PSS and frame counters only every Nth sample
+        self.sample_count = 0
+        self.shell = None
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.series = {name: array("d") for name in COLUMNS}
+        self._last_cpu = None  # (process ticks, total ticks) of the previous sample
+        self._light_script = self._build_script(dumpsys=False)
+        self._full_script = self._build_script(dumpsys=True)
+
+    def _build_script(self, dumpsys):
+        """Shell snippet producing one sample, terminated by the end marker"""
+        pkg = self.package
+        # pidof can list several processes, the first one is the app's main process
+        script = (
+            f"P=$(pidof {pkg}); P=${{P%% *}}; echo \"PID $P\"; head -1 /proc/stat; "
+            f"if [ -n \"$P\" ]; then cat /proc/$P/stat; grep VmRSS /proc/$P/status; fi; "
+        )
+        if dumpsys:
+            script += (
+                f"dumpsys meminfo {pkg} | grep -E 'TOTAL( PSS)?:? +[0-9]'; "
+                f"dumpsys gfxinfo {pkg} | grep -E 'Total frames rendered|Janky frames'; "
+            )
+        return script + f"echo {SAMPLE_END_MARKER}\n"
+
+    def _open_shell(self):
+        """Open the persistent adb shell used for all samples"""
+        cmd = ["adb"]
+        if self.device_id:
+            cmd.extend(["-s", self.device_id])
+        cmd.append("shell")
+        self.shell = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            errors="replace",
+            bufsize=1
+        )
+
+    def _read_sample(self):
+        """Run the sample script and return its output lines"""
+        full = self.dumpsys_every and self.sample_count % self.dumpsys_every == 0
+        self.sample_count += 1
+        self.shell.stdin.write(self._full_script if full else self._light_script)
+        self.shell.stdin.flush()
+        lines = []
+        while True:
+            line = self.shell.stdout.readline()
+            if not line:
+                raise EOFError("adb shell closed")
+            line = line.strip()
+            if line == SAMPLE_END_MARKER:
+                return lines
+            lines.append(line)
+
+    def _parse_sample(self, lines):
+        """Turn the raw sample output into a row of the time series"""
+        row = dict.fromkeys(COLUMNS[1:], float("nan"))
+        total_ticks = None
+        process_ticks = None
+
+        for line in lines:
+            if line.startswith("cpu "):
+                total_ticks = sum(int(v) for v in line.split()[1:])
+            elif ")" in line and line[:1].isdigit():
+                # /proc/<pid>/stat, fields after the command name start at state
+                fields = line.rsplit(")", 1)[1].split()
+                process_ticks = int(fields[11]) + int(fields[12])  # utime + stime
+            elif line.startswith("VmRSS:"):
+                row["rss_kb"] = float(line.split()[1])
+            elif line.startswith("TOTAL"):
+                match = PSS_PATTERN.match(line)
+                if match:
+                    row["pss_kb"] = float(match.group(1))
+            elif line.startswith("Total frames rendered:"):
+                row["frames_rendered"] = float(line.split(":")[1].split()[0])
+            elif line.startswith("Janky frames:"):
+                row["janky_frames"] = float(line.split(":")[1].split()[0])
+
+        if total_ticks is not None and process_ticks is not None:
+            if self._last_cpu:
+                process_delta = process_ticks - self._last_cpu[0]
+                total_delta = total_ticks - self._last_cpu[1]
+                if total_delta > 0 and process_delta >= 0:
+                    row["cpu_percent"] = 100.0 * process_delta / total_delta
+            self._last_cpu = (process_ticks, total_ticks)
+        else:
+            # App not running, restart the CPU delta on the next pid
+            self._last_cpu = None
+
+        return row
+
+    def _sample_loop(self):
+        """Thread function that samples until stopped"""
+        while not self.stop_event.is_set():
+            loop_start = time.time()
+            try:
+                lines = self._read_sample()
+            except (EOFError, OSError) as e:
+                print(f"Resource sampler stopped: {e}")
+                return
+            row = self._parse_sample(lines)
+            with self.lock:
+                self.series["timestamp"].append(loop_start)
+                for name, value in row.items():
+                    self.series[name].append(value)
+
+            remaining = self.interval - (time.time() - loop_start)
+            if remaining > 0:
+                self.stop_event.wait(remaining)
+
+    def start(self):
+        """Open the shell and start sampling in the background"""
+        self._open_shell()
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._sample_loop, daemon=True)
+        self.thread.start()
+        print(f"Resource sampler started for {self.package} every {self.interval}s")
+
+    def stop(self):
+        """Stop sampling and close the shell"""
+        self.stop_event.set()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=self.interval + 10)
+        if self.shell and self.shell.poll() is None:
+            try:
+                self.shell.stdin.write("exit\n")
+                self.shell.stdin.flush()
+                self.shell.wait(timeout=2)
+            except (OSError, subprocess.TimeoutExpired):
+                self.shell.kill()
+        self.shell = None
+
+    def rows(self):
+        """Return the time series as a list of row tuples"""
+        with self.lock:
+            return list(zip(*(self.series[name] for name in COLUMNS)))
+
+    def summary(self):
+        """Summarize peaks over the sampled period"""
+        with self.lock:
+            series = {name: [v for v in values if v == v] for name, values in self.series.items()}
+
+        def peak(name):
+            return max(series[name]) if series[name] else None
+
+        frames = series["frames_rendered"]
+        janky = series["janky_frames"]
+        timestamps = series["timestamp"]
+        return {
+            "samples": len(timestamps),
+            "duration_s": round(timestamps[-1] - timestamps[0], 3) if len(timestamps) > 1 else 0.0,
+            "peak_cpu_percent": peak("cpu_percent"),
+            "peak_rss_kb": peak("rss_kb"),
+            "peak_pss_kb": peak("pss_kb"),
+            # gfxinfo counters are cumulative per process, the growth is what this test caused
+            "frames_rendered": (max(frames) - min(frames)) if frames else None,
+            "janky_frames": (max(janky) - min(janky)) if janky else None,
+        }
+
+    def save(self, output_dir, prefix="resource"):
+        """Write the time series as CSV and the peak summary as JSON"""
+        samples_path = os.path.join(output_dir, f"{prefix}_samples.csv")
+        with open(samples_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            for row in self.rows():
+                writer.writerow([f"{row[0]:.3f}"] + ["" if v != v else f"{v:g}" for v in row[1:]])
+
+        summary = self.summary()
+        with open(os.path.join(output_dir, f"{prefix}_summary.json"), "w") as f:
+            json.dump(summary, f, indent=2)
+
+        print(f"Resource samples saved to {samples_path}")
+        print(f"Resource peaks: CPU {summary['peak_cpu_percent']}%, "
+              f"RSS {summary['peak_rss_kb']} kB, PSS {summary['peak_pss_kb']} kB, "
+              f"janky frames {summary['janky_frames']}")
+        return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sample HOT app resource usage on the streamer")
+    parser.add_argument("--device", "-d", help="ADB device ID (default: first connected device)")
+    parser.add_argument("--output", "-o", default=".", help="Output directory")
+    parser.add_argument("--interval", "-i", type=float, default=0.5,
+                        help="Sample interval in seconds (default: 0.5)")
+    parser.add_argument("--duration", "-t", type=int, default=60,
+                        help="Sampling duration in seconds (default: 60)")
+    parser.add_argument("--dumpsys-every", type=int, default=10,
+                        help="Run meminfo/gfxinfo every Nth sample, 0 never (default: 10)")
+
+    args = parser.parse_args()
+
+    sampler = DeviceResourceSampler(device_id=args.device, interval=args.interval,
+                                    dumpsys_every=args.dumpsys_every)
+    sampler.start()
+    try:
+        time.sleep(args.duration)
+    except KeyboardInterrupt:
+        print("\nStopping sampler")
+    finally:
+        sampler.stop()
+        os.makedirs(args.output, exist_ok=True)
+        sampler.save(args.output)
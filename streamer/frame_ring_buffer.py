@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Keep a rolling in-memory buffer of recent device frames so that screenshots
+for a log event can be taken retroactively, from just before and just after
+the moment the event was logged.
+"""
+
+import subprocess
+import threading
+import time
+import os
+import json
+from collections import deque
+from datetime import datetime
+
+
+class FrameRingBuffer:
+    """Capture frames in the background into a bounded ring buffer"""
+
+    def __init__(self, device_id=None, interval=0.1, max_frames=60,
+                 max_bytes=64 * 1024 * 1024):
+        self.device_id = device_id
+        self.interval = interval
+        self.max_frames = max_frames
+        self.max_bytes = max_bytes  # Upper bound on memory held by buffered frames
+        self.frames = deque()  # (timestamp, png_bytes), oldest first
+        self.total_bytes = 0
+        self.frame_count = 0
+        self.dropped_count = 0
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _grab_frame(self):
+        """Grab a single PNG frame straight to memory (no file on the device, no pull)"""
+        cmd = ["adb"]
+        if self.device_id:
+            cmd.extend(["-s", self.device_id])
+        cmd.extend(["exec-out", "screencap", "-p"])
+
+        started = time.time()
+        try:
+            result = subprocess.run(cmd, check=True, capture_output=True, timeout=10)
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            print(f"Frame capture failed: {e}")
+            return None, None
+        finished = time.time()
+
+        # screencap reads the framebuffer somewhere during the call, the midpoint
+        # is the best estimate we have of when the frame was actually shown
+        return (started + finished) / 2, result.stdout
+
+    def _append(self, timestamp, data):
+        """Add a frame, evicting the oldest ones until the buffer is within its bounds"""
+        with self.condition:
+            self.frames.append((timestamp, data))
+            self.total_bytes += len(data)
+            self.frame_count += 1
+            while self.frames and (len(self.frames) > self.max_frames
+                                   or self.total_bytes > self.max_bytes):
+                _, old = self.frames.popleft()
+                self.total_bytes -= len(old)
+                self.dropped_count += 1
+            self.condition.notify_all()
+
+    def _capture_loop(self):
+        """Thread function that keeps the buffer filled until stopped"""
+        while not self.stop_event.is_set():
+            loop_start = time.time()
+            timestamp, data = self._grab_frame()
+            if data:
+                self._append(timestamp, data)
+            # Keep a steady rate, screencap itself eats most of a short interval
+            remaining = self.interval - (time.time() - loop_start)
+            if remaining > 0:
+                self.stop_event.wait(remaining)
+
+    def start(self):
+        """Start the background capture thread"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self.thread.start()
+        print(f"Frame ring buffer started (max {self.max_frames} frames, "
+              f"{self.max_bytes // (1024 * 1024)} MB)")
+
+    def stop(self):
+        """Stop the background capture thread"""
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=15)
+        print(f"Frame ring buffer stopped: captured {self.frame_count} frames, "
+              f"evicted {self.dropped_count}")
+
+    def frames_between(self, start_time, end_time):
+        """Return buffered frames whose timestamp is within [start_time, end_time]"""
+        with self.condition:
+            return [(ts, data) for ts, data in self.frames if start_time <= ts <= end_time]
+
+    def wait_for_frame_after(self, timestamp, timeout):
+        """Block until a frame newer than timestamp is buffered, or the timeout expires"""
+        deadline = time.time() + timeout
+        with self.condition:
+            while not self.frames or self.frames[-1][0] < timestamp:
+                remaining = deadline - time.time()
+                if remaining <= 0 or self.stop_event.is_set():
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def save_event_frames(self, event_type, event_time, output_dir,
+                          before=1.0, after=1.0, tags=None):
+        """Save the frames around event_time to output_dir, tagged with the event name"""
+        # Frames after the event only exist once the capture loop has caught up
+        self.wait_for_frame_after(event_time + after, timeout=after + 10)
+        frames = self.frames_between(event_time - before, event_time + after)
+        if not frames:
+            print(f"No buffered frames around {event_type} event")
+            return []
+
+        tags = {k: v for k, v in (tags or {}).items() if v is not None}
+        suffix = ""
+        proxy_string = tags.get("proxy_string")
+        if proxy_string and "@" in proxy_string:
+            suffix = f"_proxy{proxy_string.split('@')[1]}"
+
+        event_stamp = datetime.fromtimestamp(event_time).strftime("%Y%m%d_%H%M%S_%f")[:-3]
+        saved = []
+        for timestamp, data in frames:
+            offset_ms = int(round((timestamp - event_time) * 1000))
+            filename = f"hot_event_{event_type}_{event_stamp}_{offset_ms:+d}ms{suffix}.png"
+            path = os.path.join(output_dir, filename)
+            with open(path, "wb") as f:
+                f.write(data)
+            saved.append({"file": filename, "offset_ms": offset_ms})
+
+        # Sidecar with the event tags so frames can be matched to log values later
+        sidecar = os.path.join(output_dir, f"hot_event_{event_type}_{event_stamp}.json")
+        with open(sidecar, "w") as f:
+            json.dump({
+                "event": event_type,
+                "event_time": event_time,
+                "tags": tags,
+                "frames": saved,
+            }, f, indent=2)
+
+        print(f"Saved {len(saved)} buffered frames for {event_type} event")
+        return [os.path.join(output_dir, entry["file"]) for entry in saved]
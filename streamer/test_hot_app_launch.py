@@ -8,6 +8,27 @@ from datetime import datetime
 import threading
 import queue
 
+from frame_ring_buffer import FrameRingBuffer
+from device_sampler import DeviceResourceSampler, COLUMNS as RESOURCE_COLUMNS
+
+# Shared results store at the repo root, run with the repo root on PYTHONPATH (see docs/results-store.md)
+from results_store import open_run
+
+# Log patterns that mark the events we want frames for
+EVENT_PATTERNS = {
+    'app_launch': re.compile(r'ActivityTaskManager.*START.*il\.net\.hot\.hot'),
+    'window_transition': re.compile(r'WindowManagerShell.*Transition requested'),
+    'transition_ready': re.compile(r'WindowManagerShell.*onTransitionReady'),
+    'webview_start': re.compile(r'WebViewFactory|cr_AwBrowserProcess'),
+    'back_callback': re.compile(r'OnBackInvokedCallback'),
+}
+
+# Values pulled out of event log lines and used to tag the saved frames
+VALUE_PATTERNS = {
+    'proxy_string': re.compile(r'(android\.os\.BinderProxy@[0-9a-f]+)'),
+    'transition_id': re.compile(r'\{id=(\d+)'),
+}
+
 class TestHotAppLaunch:
     """Test class for launching HOT app and capturing events"""
     
@@ -36,6 +57,10 @@ class TestHotAppLaunch:
             'transition_id': None,
             'transition_finish_time_ms': None
         }
+
+        # When each event was seen, relative to the launch command for the results store
+        self.launch_started = None
+        self.event_times = {}
         
         # Create results directory
         self.results_dir = os.path.join(
@@ -46,6 +71,28 @@ class TestHotAppLaunch:
         os.makedirs(self.results_dir, exist_ok=True)
         print(f"Results will be saved to: {self.results_dir}")
 
+        # Optional rolling frame buffer for retroactive event screenshots
+        self.frame_buffer = None
+        self.frame_save_threads = []
+        if os.environ.get('HOT_FRAME_BUFFER') == '1':
+            self.frame_buffer = FrameRingBuffer(
+                interval=float(os.environ.get('HOT_FRAME_BUFFER_INTERVAL', '0.1')),
+                max_frames=int(os.environ.get('HOT_FRAME_BUFFER_FRAMES', '60')),
+                max_bytes=int(os.environ.get('HOT_FRAME_BUFFER_MB', '64')) * 1024 * 1024
+            )
+
+        # Optional resource sampler, it costs device CPU so it's off for timing runs
+        self.resource_sampler = None
+        if os.environ.get('HOT_RESOURCE_SAMPLER') == '1':
+            self.resource_sampler = DeviceResourceSampler(
+                interval=float(os.environ.get('HOT_RESOURCE_SAMPLER_INTERVAL', '0.5')),
+                dumpsys_every=int(os.environ.get('HOT_RESOURCE_SAMPLER_DUMPSYS_EVERY', '10'))
+            )
+
+        # Event frames are matched against golden screens after the run when a golden dir is set
+        self.golden_dir = os.environ.get('HOT_VISUAL_GOLDEN')
+        self.visual_report = None
+
     def teardown_method(self):
         """Cleanup after each test method"""
         self.stop_event.set()
@@ -53,6 +100,67 @@ class TestHotAppLaunch:
             self.log_thread.join(timeout=2)
         if hasattr(self, 'screenshot_thread') and self.screenshot_thread.is_alive():
             self.screenshot_thread.join(timeout=2)
+        for thread in self.frame_save_threads:
+            thread.join(timeout=15)
+        if self.frame_buffer:
+            self.frame_buffer.stop()
+        resource_summary = None
+        if self.resource_sampler and self.resource_sampler.thread:
+            self.resource_sampler.stop()
+            resource_summary = self.resource_sampler.save(self.results_dir)
+        self._compare_golden()
+        self._store_results(resource_summary)
+
+    def _compare_golden(self):
+        """Match the saved event frames against the golden screens"""
+        if not self.golden_dir or self.launch_started is None:
+            return
+        try:
+            from visual_regression import compare_session, print_report
+            self.visual_report = compare_session(self.results_dir, self.golden_dir)
+            print_report(self.visual_report)
+        except Exception as e:
+            print(f"Visual regression failed: {e}")
+
+    def _store_results(self, resource_summary=None):
+        """Record time to each event (and the resource samples) in the shared results store"""
+        if self.launch_started is None:
+            return
+        missing = [event for event in EVENT_PATTERNS if event not in self.event_times]
+        metadata = {'results_dir': self.results_dir, 'missing_events': missing}
+        if self.visual_report:
+            metadata['screens'] = [segment['screen'] for segment in self.visual_report['timeline']]
+            metadata['differing_frames'] = [result['frame'] for result in self.visual_report['differing_frames']]
+        run = open_run('streamer', 'hot_app_launch', device=os.environ.get('ANDROID_SERIAL'),
+                       metadata=metadata, started_at=self.launch_started)
+        for event_type, event_time in sorted(self.event_times.items(), key=lambda item: item[1]):
+            run.step(event_type, duration_s=round(event_time - self.launch_started, 3),
+                     timestamp=event_time, **{k: v for k, v in self.extracted_values.items() if v})
+        if resource_summary:
+            peaks = {k: v for k, v in resource_summary.items() if k != 'duration_s'}
+            run.step('resources', duration_s=resource_summary['duration_s'], **peaks)
+            with self.resource_sampler.lock:
+                run.add_series('resources', {name: self.resource_sampler.series[name]
+                                             for name in RESOURCE_COLUMNS})
+        run.finish()
+
+    def _handle_event(self, line, received_at):
+        """Check a log line against the event patterns and record the first hit of each event"""
+        for event_type, pattern in EVENT_PATTERNS.items():
+            if self.event_detected[event_type] or not pattern.search(line):
+                continue
+            self.event_detected[event_type] = True
+            self.event_times[event_type] = received_at
+
+            for name, value_pattern in VALUE_PATTERNS.items():
+                match = value_pattern.search(line)
+                if match:
+                    self.extracted_values[name] = match.group(1)
+
+            print(f"Detected {event_type} event")
+            # Only buffered frames, a screencap + pull here would stall the log reader for seconds
+            if self.frame_buffer:
+                self._take_screenshot(event_type, event_time=received_at)
 
     def _monitor_logs(self):
         """Thread function to monitor logs for specific events"""
@@ -74,6 +182,8 @@ class TestHotAppLaunch:
                     line = process.stdout.readline()
                     if not line:
                         break
+                    received_at = time.time()
+                    self._handle_event(line, received_at)
                     
                     # Display logs with V level for WindowManagerShell and I level for ActivityManager and ActivityTaskManager
                     if re.search(r'\s+V\s+WindowManagerShell', line):
@@ -104,8 +214,21 @@ class TestHotAppLaunch:
         except Exception as e:
             print(f"Error in log monitoring: {str(e)}")
 
-    def _take_screenshot(self, event_type):
+    def _take_screenshot(self, event_type, event_time=None):
         """Take a screenshot"""
+        if self.frame_buffer:
+            # Save buffered frames around the event instead of a late screencap,
+            # off the log thread since it has to wait for the frames after the event
+            thread = threading.Thread(
+                target=self.frame_buffer.save_event_frames,
+                args=(event_type, event_time or time.time(), self.results_dir),
+                kwargs={'tags': dict(self.extracted_values)},
+                daemon=True
+            )
+            thread.start()
+            self.frame_save_threads.append(thread)
+            return None
+
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
         screenshot_base_name = f"hot_event_{event_type}_{timestamp}"
         device_screenshot_path = f"/sdcard/{screenshot_base_name}.png"
@@ -148,6 +271,11 @@ class TestHotAppLaunch:
         
         log_thread.start()
         #screenshot_thread.start()
+
+        if self.frame_buffer:
+            self.frame_buffer.start()
+        if self.resource_sampler:
+            self.resource_sampler.start()
         
         # Short pause to make sure monitoring is active before launching app
         time.sleep(2)
@@ -155,6 +283,7 @@ class TestHotAppLaunch:
         try:
             # Launch the HOT app using adb
             print("Launching HOT app...")
+            self.launch_started = time.time()
             result = subprocess.run(
                 ["adb", "shell", "am", "start", "-n", "il.net.hot.hot/.TvMainActivity"],
                 check=True,
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Match the frames of a capture session against golden frames of known screens
+(home screen, login keypad, ...) and report which screens appeared when and
+which frames differ from their golden.
+
+Golden frames live in one directory: <screen>.png plus an optional
+<screen>.json with the regions to compare and the ones to ignore (clock,
+posters), boxes are [x0, y0, x1, y1] fractions of the frame:
+
+    {"regions": [{"name": "keypad", "box": [0.3, 0.4, 0.7, 0.9], "threshold": 0.01}],
+     "ignore": [[0.85, 0.0, 1.0, 0.08]]}
+
+Without a sidecar the frame is compared as a 4x4 grid.
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+WORK_SIZE = (256, 144)  # Frames are compared at this size, 16:9 like the TV output
+HASH_THRESHOLD = 14  # Max dHash bit distance for a golden to be a candidate at all
+MATCH_THRESHOLD = 0.12  # Max mean difference (0-1) for a frame to be that screen
+PIXEL_TOLERANCE = 24  # Gray levels a pixel may move (scaling, encoder noise) before it counts as changed
+REGION_THRESHOLD = 0.02  # Default max fraction of changed pixels in a region
+# Capture stamp of a frame name, ring buffer frames add their offset from the event: _<stamp>_+120ms
+FRAME_TIME_PATTERN = re.compile(r'(\d{8}_\d{6}_\d{3})(?:_([+-]\d+)ms)?')
+
+
+def _load_gray(path):
+    """Frame as a float32 array at WORK_SIZE, and its 64 bit dHash"""
+    with Image.open(path) as img:
+        # reduce() is a cheap box filter, it takes most of the decode size away before the resize
+        factor = max(1, min(img.width // WORK_SIZE[0], img.height // WORK_SIZE[1]))
+        gray = img.convert('L')
+        if factor > 1:
+            gray = gray.reduce(factor)
+        work = gray.resize(WORK_SIZE, Image.BILINEAR)
+    pixels = np.asarray(work, dtype=np.float32)
+    return pixels, dhash(work)
+
+
+def dhash(gray_image):
+    """Difference hash: 8x8 bits of left/right brightness steps"""
+    small = np.asarray(gray_image.resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def _grid_regions(rows=4, cols=4):
+    return [{'name': f'r{r}c{c}', 'box': [c / cols, r / rows, (c + 1) / cols, (r + 1) / rows]}
+            for r in range(rows) for c in range(cols)]
+
+
+def _pixel_boxes(boxes):
+    """Fraction boxes to integer pixel boxes at WORK_SIZE, as an (n, 4) array"""
+    w, h = WORK_SIZE
+    scale = np.array([w, h, w, h], dtype=np.float32)
+    pixel = np.rint(np.asarray(boxes, dtype=np.float32).reshape(-1, 4) * scale).astype(np.int32)
+    pixel[:, 2] = np.maximum(pixel[:, 2], pixel[:, 0] + 1)
+    pixel[:, 3] = np.maximum(pixel[:, 3], pixel[:, 1] + 1)
+    return pixel
+
+
+def load_goldens(golden_dir):
+    """Golden pixels, hashes, region boxes and ignore masks of every <screen>.png"""
+    goldens = []
+    for filename in sorted(os.listdir(golden_dir)):
+        if not filename.endswith('.png'):
+            continue
+        screen = filename[:-4]
+        config = {}
+        config_path = os.path.join(golden_dir, f'{screen}.json')
+        if os.path.exists(config_path):
+            with open(config_path) as f:
+                config = json.load(f)
+        regions = config.get('regions') or _grid_regions()
+        pixels, frame_hash = _load_gray(os.path.join(golden_dir, filename))
+
+        mask = np.ones(pixels.shape, dtype=np.float32)
+        if config.get('ignore'):
+            for x0, y0, x1, y1 in _pixel_boxes(config['ignore']):
+                mask[y0:y1, x0:x1] = 0.0
+        boxes = _pixel_boxes([region['box'] for region in regions])
+        # Pixels that count in each region, ignored ones excluded
+        counted = _box_sums(np.cumsum(np.cumsum(mask, 0), 1), boxes)
+        goldens.append({
+            'screen': screen,
+            'pixels': pixels,
+            'hash': frame_hash,
+            'mask': mask,
+            'names': [region['name'] for region in regions],
+            'boxes': boxes,
+            'counted': np.maximum(counted, 1.0),
+            'thresholds': np.array([region.get('threshold', REGION_THRESHOLD) for region in regions],
+                                   dtype=np.float32),
+        })
+    return goldens
+
+
+def _box_sums(integral, boxes):
+    """Sums over many boxes at once from an integral image"""
+    padded = np.pad(integral, ((1, 0), (1, 0)))
+    x0, y0, x1, y1 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    return padded[y1, x1] - padded[y0, x1] - padded[y1, x0] + padded[y0, x0]
+
+
+def compare_frame(pixels, golden):
+    """Mean difference (0-1) of one frame against one golden, and the fraction of changed pixels per region"""
+    diff = np.abs(pixels - golden['pixels']) * golden['mask']
+    overall = float(diff.sum() / max(golden['mask'].sum(), 1.0) / 255.0)
+    # One integral image of the changed pixels gives every region's count at once
+    changed = (diff > PIXEL_TOLERANCE).astype(np.float32)
+    region_diff = _box_sums(np.cumsum(np.cumsum(changed, 0), 1), golden['boxes']) / golden['counted']
+    return overall, region_diff
+
+
+_worker_goldens = None
+
+
+def _init_worker(goldens):
+    global _worker_goldens
+    _worker_goldens = goldens
+
+
+def _hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def match_frame(path):
+    """Best matching golden screen of a frame, with the regions that differ from it"""
+    pixels, frame_hash = _load_gray(path)
+    best = None
+    for golden in _worker_goldens:
+        distance = _hamming(frame_hash, golden['hash'])
+        if distance > HASH_THRESHOLD:
+            continue  # Prefilter: structurally a different screen, skip the pixel diff
+        overall, region_diff = compare_frame(pixels, golden)
+        if overall <= MATCH_THRESHOLD and (best is None or overall < best['diff']):
+            changed = np.nonzero(region_diff > golden['thresholds'])[0]
+            best = {
+                'screen': golden['screen'],
+                'hash_distance': distance,
+                'diff': round(overall, 4),
+                'changed_regions': [{'name': golden['names'][i], 'diff': round(float(region_diff[i]), 4)}
+                                    for i in changed],
+            }
+    result = {'frame': path, 'screen': None, 'hash_distance': None, 'diff': None, 'changed_regions': []}
+    if best:
+        result.update(best)
+    return result
+
+
+def frame_time(path):
+    """Capture time from the hot_YYYYMMDD_HHMMSS_mmm file name plus the ring buffer's
+    _+{offset}ms suffix of event frames, else the file mtime"""
+    match = FRAME_TIME_PATTERN.search(os.path.basename(path))
+    if match:
+        stamp = time.strptime(match.group(1)[:-4], '%Y%m%d_%H%M%S')
+        offset_ms = int(match.group(2)) if match.group(2) else 0
+        return time.mktime(stamp) + (int(match.group(1)[-3:]) + offset_ms) / 1000
+    return os.path.getmtime(path)
+
+
+def find_frames(session_dir):
+    frames = []
+    for root, _, files in os.walk(session_dir):
+        frames.extend(os.path.join(root, name) for name in files if name.endswith('.png'))
+    return sorted(frames, key=frame_time)
+
+
+def build_timeline(results):
+    """Collapse consecutive frames of the same screen into segments"""
+    segments = []
+    for result in results:
+        if segments and segments[-1]['screen'] == result['screen']:
+            segment = segments[-1]
+        else:
+            segment = {'screen': result['screen'], 'start': result['time'], 'end': result['time'],
+                       'frames': 0, 'differing_frames': 0, 'changed_regions': {}}
+            segments.append(segment)
+        segment['end'] = result['time']
+        segment['frames'] += 1
+        if result['changed_regions']:
+            segment['differing_frames'] += 1
+            for region in result['changed_regions']:
+                worst = segment['changed_regions'].get(region['name'], 0.0)
+                segment['changed_regions'][region['name']] = max(worst, region['diff'])
+    return segments
+
+
+def compare_session(session_dir, golden_dir, workers=None, output=None):
+    """Match every frame of a session, write visual_timeline.json and return the report"""
+    started = time.perf_counter()
+    goldens = load_goldens(golden_dir)
+    if not goldens:
+        raise ValueError(f"No golden frames (*.png) in {golden_dir}")
+    frames = find_frames(session_dir)
+
+    # Goldens go to each worker once, frames are handed out in chunks
+    workers = workers or os.cpu_count() or 2
+    chunksize = max(1, len(frames) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(goldens,)) as pool:
+        results = list(pool.map(match_frame, frames, chunksize=chunksize))
+    for result in results:
+        result['time'] = frame_time(result['frame'])
+        result['frame'] = os.path.relpath(result['frame'], session_dir)
+
+    report = {
+        'session': os.path.abspath(session_dir),
+        'golden_dir': os.path.abspath(golden_dir),
+        'frames': len(results),
+        'duration_s': round(time.perf_counter() - started, 2),
+        'timeline': build_timeline(results),
+        'differing_frames': [r for r in results if r['changed_regions']],
+        'results': results,
+    }
+    output = output or os.path.join(session_dir, 'visual_timeline.json')
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def record_golden(screen, frame_path, golden_dir):
+    """Store a frame as the golden of a screen, with a default grid sidecar to edit"""
+    os.makedirs(golden_dir, exist_ok=True)
+    shutil.copyfile(frame_path, os.path.join(golden_dir, f'{screen}.png'))
+    config_path = os.path.join(golden_dir, f'{screen}.json')
+    if not os.path.exists(config_path):
+        with open(config_path, 'w') as f:
+            json.dump({'regions': _grid_regions(), 'ignore': []}, f, indent=2)
+    print(f"Recorded golden frame for {screen}: {frame_path}")
+
+
+def print_report(report):
+    print(f"{report['frames']} frames matched in {report['duration_s']}s")
+    t0 = report['timeline'][0]['start'] if report['timeline'] else 0
+    for segment in report['timeline']:
+        changed = ', '.join(f"{name} {diff:.3f}" for name, diff in segment['changed_regions'].items())
+        print(f"  +{segment['start'] - t0:7.2f}s .. +{segment['end'] - t0:7.2f}s  "
+              f"{segment['screen'] or '(unknown)':<20} {segment['frames']:>4} frames"
+              + (f"  {segment['differing_frames']} differ: {changed}" if segment['differing_frames'] else ''))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare capture session frames against golden screens")
+    parser.add_argument("session", nargs="?", help="Session or test_results/run_* directory with PNG frames")
+    parser.add_argument("--golden", "-g", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden"),
+                        help="Golden frames directory (default: streamer/golden)")
+    parser.add_argument("--workers", "-w", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--output", "-o", help="Report path (default: <session>/visual_timeline.json)")
+    parser.add_argument("--record", nargs=2, metavar=("SCREEN", "FRAME"), help="Store FRAME as the golden of SCREEN")
+
+    args = parser.parse_args()
+    if args.record:
+        record_golden(args.record[0], args.record[1], args.golden)
+    elif args.session:
+        print_report(compare_session(args.session, args.golden, args.workers, args.output))
+    else:
+        parser.error("a session directory or --record is required")
@@ -1,4 +1,5 @@
-from prefect import flow, task
+from prefect import flow, task, unmapped
+from prefect.task_runners import ThreadPoolTaskRunner
 import pytest
 import sys
 import os
@@ -6,160 +7,159 @@ from prefect.testing.utilities import prefect_test_harness
 from prefect.tasks import NO_CACHE  # Import the NO_CACHE policy
 import time
 
-# Add the parent directory to sys.path to allow imports from misc
+# Add the parent directory to sys.path to allow imports from misc, the results store needs the repo root on PYTHONPATH
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from misc.fast_runner import call_task, map_task
+
+# TV_FAST_PATH=1 runs flows in-process, without the Prefect test harness or task orchestration
+FAST_PATH = os.environ.get("TV_FAST_PATH") == "1"
+
 @pytest.fixture(autouse=True, scope="session")
 def prefect_test_fixture():
+    if FAST_PATH:
+        yield
+        return
     with prefect_test_harness():
         yield
 
 
 @task
-def init_tv():
-    # Initialize TV connection from the misc directory
-    from misc.tv_app_navigation import init_tv
-    return init_tv()
+def init_tv(tv_host=None, tv_port=8002):
+    # Open (or reuse) the shared TV session, tasks get its handle instead of the connection
+    from misc.tv_session import open_session
+    return open_session(tv_host or os.environ["SAMSUNG_TV_HOST"], port=tv_port)
     
-@task(cache_policy=NO_CACHE)  # Disable caching for this task since TV object can't be serialized
-def navigate_to_hot_app_samsung_43_crystal(tv):
+@task(cache_policy=NO_CACHE)  # Disable caching for this task since it drives the TV
+def navigate_to_hot_app_samsung_43_crystal(tv_handle):
     from misc.tv_app_navigation import navigate_and_select_app
-    return navigate_and_select_app(tv)
+    from misc.tv_session import get_session
+    return navigate_and_select_app(get_session(tv_handle))
 
 @task(cache_policy=NO_CACHE)
-def insert_otp_user(tv):
-    user = "816178339"
-    phone = "0523244358"
-    otp = "123456"
-    # Insert user on a phone like keyboard with remote control when default  button is on 0
-    
+def insert_otp_user(tv_handle, phone="0523244358", otp="123456"):
+    # Insert phone and otp on a phone like keyboard with remote control, focus starts on 0
+    from misc.keypad import KeypadPlanner, KeyPacer
+    from misc.screen_probe import ScreenStateProbe
+    from misc.tv_session import get_session
+    tv = get_session(tv_handle)
+    planner = KeypadPlanner()
+    pacer = KeyPacer(tv)
+    probe = ScreenStateProbe.for_session(tv)
 
-    # click 0
-    tv.send_key("KEY_ENTER")
-
-    # click 5
-    tv.send_key("KEY_UP")
-    tv.send_key("KEY_UP")
-    tv.send_key("KEY_ENTER")
-
-    # click 2
-    tv.send_key("KEY_UP")
-    tv.send_key("KEY_ENTER")
-
-    # click 3
-    tv.send_key("KEY_RIGHT")
-    tv.send_key("KEY_ENTER")
-
-    # click 2
-    tv.send_key("KEY_LEFT")
-    tv.send_key("KEY_ENTER")
-
-    # click 4 * 2
-    tv.send_key("KEY_LEFT")
-    tv.send_key("KEY_DOWN")
-    tv.send_key("KEY_ENTER")
-    time.sleep(1)
-    tv.send_key("KEY_ENTER")
-    time.sleep(1)
-
-    # click 3
-    tv.send_key("KEY_RIGHT")
-    tv.send_key("KEY_RIGHT")
-    tv.send_key("KEY_UP")
-    tv.send_key("KEY_ENTER")
-    time.sleep(1)
-
-    # click 5
-    tv.send_key("KEY_LEFT")
-    tv.send_key("KEY_DOWN")
-    tv.send_key("KEY_ENTER")
-    time.sleep(1)
-    
-    
-    # click 8
-    tv.send_key("KEY_DOWN")
-    tv.send_key("KEY_ENTER")
-    time.sleep(1)
-
-    # submit otp form
-    tv.send_key("KEY_ENTER")
-    time.sleep(5)
-
-    #click 1
-    tv.send_key("KEY_UP")
-    tv.send_key("KEY_UP")
-    tv.send_key("KEY_UP")
-    tv.send_key("KEY_LEFT")
-    tv.send_key("KEY_ENTER")
-    time.sleep(1)
-    
-    #click 2
-    tv.send_key("KEY_RIGHT")
-    tv.send_key("KEY_ENTER")
-    time.sleep(1)
-
-    #click 3
-    tv.send_key("KEY_RIGHT")
-    tv.send_key("KEY_ENTER")
-    time.sleep(1)
-
-    #click 4
-    tv.send_key("KEY_LEFT")
-    tv.send_key("KEY_LEFT")
-    tv.send_key("KEY_DOWN")
-    tv.send_key("KEY_ENTER")
-    time.sleep(1)
-
-    #click 5
-    tv.send_key("KEY_RIGHT")
-    tv.send_key("KEY_ENTER")
-    time.sleep(1)
-
-    #click 6
-    tv.send_key("KEY_RIGHT")
-    tv.send_key("KEY_ENTER")
-    time.sleep(1)
-
-    #submit otp code
-    tv.send_key("KEY_ENTER")
-    time.sleep(5)
-    
-    
-    
-    
-    
+    # type phone number, focus moves to the submit button after the last digit
+    pacer.type_digits(planner, phone)
 
-    
-    
-    
+    # submit phone form and wait for the otp form, confirmed on frames when TV_FRAME_SOURCE
+    # and a reference for the screen exist, otherwise the fixed delay is kept
+    pacer.send(["KEY_ENTER"])
+    probe.wait_for_screen("otp_form", timeout=15)
 
-    # submit form with התחבר button
-    
-    time.sleep(2)
+    # type otp code, the new form starts focused on 0 again
+    pacer.type_digits(planner, otp)
 
+    # submit otp code
+    pacer.send(["KEY_ENTER"])
+    probe.wait_for_screen("logged_in", timeout=15)
 
-    
-    return True
+    print(f"Screen waits: {probe.waits}, unconfirmed: {probe.unconfirmed}")
+    return dict(probe.waits, unconfirmed_screens=len(probe.unconfirmed))
     
 
 @flow
-def otp_flow():
-    # Initialize TV and get the connection object
-    tv = init_tv()
-    
-    # Pass the TV connection to navigate function
-    navigate_to_hot_app_samsung_43_crystal(tv)
-    
-    # Enter OTP
-    insert_otp_user(tv)
+def otp_flow(tv_host=None, tv_port=8002, navigate=True):
+    from misc.tv_session import close_session
+    from results_store import open_run
+    run = open_run("tv", "otp_flow", metadata={"fast_path": FAST_PATH})
+    tv_handle = None
+
+    try:
+        # Initialize TV and get the handle of the shared session
+        with run.timed("init_tv"):
+            tv_handle = call_task(init_tv, tv_host, tv_port)
+        run.run["device"] = tv_handle
+        
+        # Pass the TV session handle to navigate function
+        if navigate:
+            with run.timed("navigate_to_hot_app"):
+                call_task(navigate_to_hot_app_samsung_43_crystal, tv_handle)
+        
+        # Enter OTP
+        with run.timed("insert_otp_user") as metrics:
+            metrics.update(call_task(insert_otp_user, tv_handle))
+    finally:
+        if tv_handle:
+            close_session(tv_handle)
+        run.finish()
     
     return True
 
+@task(cache_policy=NO_CACHE)
+def otp_on_device(device, inventory=None, lease_timeout=1800):
+    # Lease the TV for the whole run so no other flow drives it meanwhile
+    from misc.device_pool import DevicePool
+    pool = DevicePool.from_file(inventory)
+    result = {"device": device["name"], "model": device.get("model"), "status": "success", "error": None}
+    started = time.perf_counter()
+    try:
+        with pool.lease(device["name"], lease_timeout=lease_timeout):
+            call_task(otp_flow, tv_host=device["host"], tv_port=device.get("port", 8002))
+    except Exception as e:
+        result["status"] = "failure"
+        result["error"] = str(e)
+    result["duration_s"] = round(time.perf_counter() - started, 2)
+    print(f"{device['name']} ({result['model']}): {result['status']} in {result['duration_s']}s")
+    return result
+
+@flow(task_runner=ThreadPoolTaskRunner(max_workers=16))
+def otp_pool_flow(inventory=None, tags=None, models=None, lease_timeout=1800):
+    # Run the OTP flow on every matching TV at once, wall time is the slowest device
+    from misc.device_pool import DevicePool
+    devices = DevicePool.from_file(inventory).select(tags=tags, models=models)
+    started = time.perf_counter()
+    futures = map_task(otp_on_device, devices, inventory=unmapped(inventory),
+                       lease_timeout=unmapped(lease_timeout))
+    results = [future.result() for future in futures]
+
+    wall_time = time.perf_counter() - started
+    device_time = sum(r["duration_s"] for r in results)
+    print(f"Pool run on {len(results)} devices: {wall_time:.1f}s wall, {device_time:.1f}s summed")
+    return results
+
+def run_flow(flow_fn, **parameters):
+    # Run through Prefect, or in-process on the fast path (optionally reported afterwards)
+    if not FAST_PATH:
+        return flow_fn(**parameters)
+    from misc.fast_runner import run_in_process, report_to_prefect
+    run = run_in_process(flow_fn, **parameters)
+    if os.environ.get("TV_FAST_PATH_REPORT") == "1":
+        report_to_prefect(flow_fn, run)
+    if run.error:
+        raise run.error
+    return run.result
+
 def test_otp_flow():
-    assert otp_flow() == True
+    assert run_flow(otp_flow) == True
+
+def test_otp_flow_emulated(monkeypatch, tmp_path):
+    # Same flow against the local TV emulator, no TV on the LAN needed. Its forms take a
+    # while to change after a submit and drop keys meanwhile, so typing before the next
+    # screen is confirmed on its frames loses digits
+    from misc.tv_emulator import TVEmulator
+    with TVEmulator(transition_delay=1.5) as emulator:
+        monkeypatch.setenv("HOT_TV_APP_ID", emulator.app_id)
+        monkeypatch.setenv("TV_FRAME_SOURCE", emulator.frame_url)
+        monkeypatch.setenv("TV_SCREEN_REFERENCES", emulator.write_references(str(tmp_path)))
+        assert run_flow(otp_flow, tv_host=emulator.host, tv_port=emulator.port, navigate=False) == True
+        assert emulator.dropped_keys == []
+        assert emulator.verify(["0523244358", "123456"]) == []
 
 if __name__ == "__main__":
-    # Run the flow directly when the script is executed
-    print("Running OTP TV authentication flow...")
-    result = otp_flow()
+    # Run the flow directly when the script is executed, "pool" runs it on every TV in the inventory
+    if len(sys.argv) > 1 and sys.argv[1] == "pool":
+        print("Running OTP TV authentication flow on the device pool...")
+        result = run_flow(otp_pool_flow, tags=sys.argv[2:] or None)
+    else:
+        print("Running OTP TV authentication flow...")
+        result = run_flow(otp_flow)
     print(f"Flow completed with result: {result}")
\ No newline at end of file
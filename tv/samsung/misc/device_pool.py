@@ -0,0 +1,119 @@
+"""
+Inventory of lab Samsung TVs with exclusive, expiring leases so several flows
+can run against the pool at once without two of them driving the same TV.
+"""
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+DEFAULT_INVENTORY = os.environ.get(
+    "SAMSUNG_TV_INVENTORY",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "devices.json")
+)
+LEASE_DIR = os.path.join(tempfile.gettempdir(), "hot_tv_leases")
+
+
+class LeaseTimeout(Exception):
+    """Raised when a device stays leased by someone else for longer than we wait"""
+
+
+class DevicePool:
+    """TVs from an inventory file, leased through lock files shared by all local processes"""
+
+    def __init__(self, devices, lease_dir=LEASE_DIR):
+        self.devices = {device["name"]: device for device in devices}
+        self.lease_dir = lease_dir
+        os.makedirs(lease_dir, exist_ok=True)
+
+    @classmethod
+    def from_file(cls, path=None, **kwargs):
+        """Load the pool from a JSON inventory: a list of {name, host, port, model, tags}"""
+        with open(path or DEFAULT_INVENTORY) as f:
+            return cls(json.load(f), **kwargs)
+
+    def select(self, tags=None, models=None):
+        """Devices having all of tags and, if given, one of models"""
+        selected = []
+        for device in self.devices.values():
+            if tags and not set(tags) <= set(device.get("tags", [])):
+                continue
+            if models and device.get("model") not in models:
+                continue
+            selected.append(device)
+        return selected
+
+    def _lease_path(self, name):
+        return os.path.join(self.lease_dir, f"{name}.lease")
+
+    @contextmanager
+    def _lock(self, name):
+        """Serialize every read-modify-write of a device's lease across threads and processes"""
+        with open(os.path.join(self.lease_dir, f"{name}.lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_lease(self, name):
+        try:
+            with open(self._lease_path(name)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _try_acquire(self, name, holder, lease_timeout):
+        """Write our lease if the device is free or its lease expired, returns the lease token or None"""
+        with self._lock(name):
+            current = self._read_lease(name)
+            if current and current.get("expires", 0) >= time.time():
+                return None
+            if current:
+                print(f"Lease on {name} held by {current.get('holder')} expired, taking over")
+            # Unique per acquisition, threads of one process must not look like the same holder
+            token = f"{holder}:{os.getpid()}:{threading.get_ident()}:{uuid.uuid4().hex}"
+            lease = {"holder": holder, "token": token, "acquired": time.time(),
+                     "expires": time.time() + lease_timeout}
+            fd, tmp = tempfile.mkstemp(dir=self.lease_dir, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(lease, f)
+            os.replace(tmp, self._lease_path(name))
+            return token
+
+    def acquire(self, name, holder=None, lease_timeout=1800, wait=600, poll=1.0):
+        """Lease a device exclusively, waiting up to wait seconds for it to become free, returns the lease token"""
+        if name not in self.devices:
+            raise KeyError(f"Unknown device {name}")
+        holder = holder or f"pid{os.getpid()}"
+        deadline = time.time() + wait
+        while True:
+            token = self._try_acquire(name, holder, lease_timeout)
+            if token:
+                return token
+            if time.time() >= deadline:
+                raise LeaseTimeout(f"Device {name} still leased after waiting {wait}s")
+            time.sleep(poll)
+
+    def release(self, name, token):
+        """Give a leased device back to the pool, unless the lease expired and someone else took it over"""
+        with self._lock(name):
+            current = self._read_lease(name)
+            if not current or current.get("token") != token:
+                print(f"Lease on {name} is no longer ours, leaving it")
+                return False
+            os.remove(self._lease_path(name))
+            return True
+
+    @contextmanager
+    def lease(self, name, **kwargs):
+        """Hold a device lease for the duration of a with block"""
+        token = self.acquire(name, **kwargs)
+        try:
+            yield self.devices[name]
+        finally:
+            self.release(name, token)
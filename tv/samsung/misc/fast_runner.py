@@ -0,0 +1,170 @@
+"""
+Run Prefect flows in-process without an orchestration backend.
+
+The flow and task definitions stay as they are. Flows call their tasks and
+subflows through call_task/map_task: inside run_in_process (tracked with a
+context variable, so other threads and runs are unaffected) the plain
+functions are called directly with per-task timing, anywhere else the call
+goes to Prefect as usual. The outcome can be reported to Prefect
+afterwards, so the UI still shows the run without paying for the API server
+and task orchestration while keys are being sent.
+"""
+import argparse
+import contextvars
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from prefect import Task
+
+# The fast run the current context belongs to, None outside run_in_process
+_current_run = contextvars.ContextVar("fast_run", default=None)
+
+
+class FastRun:
+    """Outcome of an in-process flow run"""
+
+    def __init__(self, flow_name, parameters):
+        self.flow_name = flow_name
+        self.parameters = parameters
+        self.result = None
+        self.error = None
+        self.started = time.perf_counter()
+        self.startup_s = None  # Time from run start until the first task started
+        self.duration_s = None
+        self.tasks = []  # (task name, seconds, status)
+        self.lock = threading.Lock()  # Mapped tasks record from the pool threads
+        self.executor = None
+
+    def record(self, name, started, status):
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.tasks.append((name, elapsed, status))
+
+    def call(self, target, *args, **kwargs):
+        """Run a task's or subflow's function directly, timed"""
+        with self.lock:
+            if self.startup_s is None:
+                self.startup_s = time.perf_counter() - self.started
+        started = time.perf_counter()
+        try:
+            result = target.fn(*args, **kwargs)
+        except Exception:
+            self.record(target.name, started, "failed")
+            raise
+        self.record(target.name, started, "completed")
+        return result
+
+    def submit(self, target, *args, **kwargs):
+        # The pool thread runs in a copy of this context, so it still belongs to this run
+        context = contextvars.copy_context()
+        return self.executor.submit(context.run, self.call, target, *args, **kwargs)
+
+    def map(self, target, iterable, **kwargs):
+        # Prefect's unmapped() wraps constant arguments, unwrap them like the task runner does
+        constants = {k: getattr(v, "value", v) for k, v in kwargs.items()}
+        return [self.submit(target, item, **constants) for item in iterable]
+
+
+def call_task(target, *args, **kwargs):
+    """Call a task or subflow, directly inside a fast run, through Prefect otherwise"""
+    run = _current_run.get()
+    if run is None:
+        return target(*args, **kwargs)
+    return run.call(target, *args, **kwargs)
+
+
+def map_task(target, iterable, **kwargs):
+    """Map a task over iterable, on the fast run's thread pool inside one, with Task.map otherwise"""
+    run = _current_run.get()
+    if run is None:
+        return target.map(iterable, **kwargs)
+    return run.map(target, iterable, **kwargs)
+
+
+def run_in_process(flow, max_workers=16, **parameters):
+    """Run flow with the tasks and subflows it calls through call_task/map_task executed as plain functions"""
+    run = FastRun(flow.name, parameters)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        run.executor = executor
+        token = _current_run.set(run)
+        try:
+            run.result = flow.fn(**parameters)
+        except Exception as e:
+            run.error = e
+        finally:
+            _current_run.reset(token)
+
+    run.duration_s = time.perf_counter() - run.started
+    summary = ", ".join(f"{name} {seconds:.2f}s" for name, seconds, _ in run.tasks)
+    print(f"Fast run of {run.flow_name} finished in {run.duration_s:.2f}s: {summary}")
+    return run
+
+
+def report_to_prefect(flow, run):
+    """Record a finished fast run, and its task runs, in the configured Prefect API"""
+    from prefect.client.orchestration import get_client
+    from prefect.states import Completed, Failed
+
+    def final_state(failed, message):
+        return Failed(message=message) if failed else Completed(message=message)
+
+    with get_client(sync_client=True) as client:
+        flow_run = client.create_flow_run(
+            flow,
+            parameters=run.parameters,
+            tags=["fast-path"],
+            state=final_state(run.error is not None,
+                              f"fast path run in {run.duration_s:.2f}s" +
+                              (f": {run.error}" if run.error else "")),
+        )
+        tasks = {obj.name: obj for obj in flow.fn.__globals__.values() if isinstance(obj, Task)}
+        for index, (name, seconds, status) in enumerate(run.tasks):
+            if name not in tasks:
+                continue  # Subflows show up as their own runs when reported
+            client.create_task_run(
+                tasks[name],
+                flow_run_id=flow_run.id,
+                dynamic_key=str(index),
+                state=final_state(status == "failed", f"{seconds:.3f}s in fast path"),
+            )
+    print(f"Reported fast run to Prefect as flow run {flow_run.id}")
+    return flow_run.id
+
+
+def compare_startup(flow, **parameters):
+    """Time the same flow through prefect_test_harness and through the fast path"""
+    from prefect.testing.utilities import prefect_test_harness
+
+    started = time.perf_counter()
+    with prefect_test_harness():
+        harness_ready = time.perf_counter() - started
+        flow(**parameters)
+    harness_total = time.perf_counter() - started
+
+    fast = run_in_process(flow, **parameters)
+    return {
+        "harness_startup_s": round(harness_ready, 3),
+        "harness_total_s": round(harness_total, 3),
+        "fast_startup_s": round(fast.startup_s or 0.0, 3),
+        "fast_total_s": round(fast.duration_s, 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare harness and fast path runs of the OTP flow on the TV emulator")
+    parser.parse_args()
+
+    samsung_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.extend([samsung_dir, os.path.join(samsung_dir, "deployments")])
+    from misc.tv_emulator import TVEmulator
+    from otp import otp_flow
+
+    with TVEmulator() as emulator:
+        os.environ["HOT_TV_APP_ID"] = emulator.app_id
+        timings = compare_startup(otp_flow, tv_host=emulator.host, tv_port=emulator.port, navigate=False)
+    for name, value in timings.items():
+        print(f"{name}: {value}")
@@ -0,0 +1,143 @@
+"""
+Plan and send remote-control key sequences for the on-screen numeric keypad
+of the HOT app login screens.
+"""
+import time
+from collections import deque
+
+# On-screen phone-like keypad, focus starts on 0 when a form opens
+KEYPAD_LAYOUT = (
+    ("1", "2", "3"),
+    ("4", "5", "6"),
+    ("7", "8", "9"),
+    (None, "0", None),
+)
+
+MOVES = {
+    "KEY_UP": (-1, 0),
+    "KEY_DOWN": (1, 0),
+    "KEY_LEFT": (0, -1),
+    "KEY_RIGHT": (0, 1),
+}
+
+
+class KeypadPlanner:
+    """Compute the shortest remote key path to type a digit string on the keypad"""
+
+    def __init__(self, layout=KEYPAD_LAYOUT, start="0"):
+        self.layout = layout
+        self.start = start
+        self.positions = {
+            label: (row, col)
+            for row, cells in enumerate(layout)
+            for col, label in enumerate(cells)
+            if label is not None
+        }
+        self._paths = {}  # (from, to) -> key list, the keypad is tiny so cache everything
+
+    def neighbour(self, label, key):
+        """Label focused after pressing key on label, or None if focus can't move there"""
+        row, col = self.positions[label]
+        d_row, d_col = MOVES[key]
+        row, col = row + d_row, col + d_col
+        if 0 <= row < len(self.layout) and 0 <= col < len(self.layout[row]):
+            return self.layout[row][col]
+        return None
+
+    def path(self, source, target):
+        """Shortest list of arrow keys moving focus from source to target"""
+        if (source, target) in self._paths:
+            return self._paths[(source, target)]
+
+        # Breadth-first search so layouts with gaps are handled correctly
+        previous = {source: None}
+        pending = deque([source])
+        while pending:
+            label = pending.popleft()
+            if label == target:
+                break
+            for key in MOVES:
+                neighbour = self.neighbour(label, key)
+                if neighbour is not None and neighbour not in previous:
+                    previous[neighbour] = (label, key)
+                    pending.append(neighbour)
+
+        if target not in previous:
+            raise ValueError(f"Key {target!r} is not reachable from {source!r} on the keypad")
+
+        keys = []
+        label = target
+        while previous[label] is not None:
+            label, key = previous[label]
+            keys.append(key)
+        keys.reverse()
+
+        self._paths[(source, target)] = keys
+        return keys
+
+    def plan(self, digits, start=None):
+        """Full key sequence (moves plus KEY_ENTER per digit) to type digits"""
+        focus = start or self.start
+        keys = []
+        for digit in str(digits):
+            if digit not in self.positions:
+                raise ValueError(f"Character {digit!r} is not on the keypad")
+            keys.extend(self.path(focus, digit))
+            keys.append("KEY_ENTER")
+            focus = digit
+        return keys
+
+
+class KeyPacer:
+    """Send keys with short inter-key delays that adapt to how fast the TV responds"""
+
+    def __init__(self, tv, move_delay=0.08, enter_delay=0.25, max_delay=1.5, retries=2):
+        self.tv = tv
+        self.move_delay = move_delay
+        self.enter_delay = enter_delay
+        self.max_delay = max_delay
+        self.retries = retries
+        self.latency = 0.0  # Smoothed send_key round trip time
+        self.backoff = 1.0  # Grows after failed sends, shrinks again on success
+        self.last_sent = None  # When the previous send started, and the gap it wants before the next
+        self.last_gap = 0.0
+
+    def _delay(self, key):
+        """Time between sending key and sending the next one"""
+        base = self.enter_delay if key == "KEY_ENTER" else self.move_delay
+        # A TV that is slow to take keys is also slow to move focus, the send itself already took latency
+        return min(self.max_delay, max(base, self.latency) * self.backoff)
+
+    def _wait_for_gap(self):
+        """Sleep only what is left of the gap since the previous send, a blocking send_key counts towards it"""
+        if self.last_sent is not None:
+            remaining = self.last_gap - (time.perf_counter() - self.last_sent)
+            if remaining > 0:
+                time.sleep(remaining)
+
+    def send(self, keys):
+        """Send keys in order, retrying a failed key with a longer delay"""
+        for key in keys:
+            for attempt in range(self.retries + 1):
+                self._wait_for_gap()
+                started = time.perf_counter()
+                try:
+                    self.tv.send_key(key)
+                except Exception as e:
+                    if attempt == self.retries:
+                        raise
+                    self.backoff = min(self.backoff * 2, 8.0)
+                    print(f"Sending {key} failed ({e}), retrying")
+                    self.last_sent, self.last_gap = started, self._delay(key)
+                    continue
+                elapsed = time.perf_counter() - started
+                self.latency = elapsed if not self.latency else 0.8 * self.latency + 0.2 * elapsed
+                self.backoff = max(1.0, self.backoff * 0.75)
+                self.last_sent, self.last_gap = started, self._delay(key)
+                break
+
+    def type_digits(self, planner, digits, start=None):
+        """Plan and send a digit string, returns the number of keys sent"""
+        keys = planner.plan(digits, start=start)
+        self.send(keys)
+        return len(keys)
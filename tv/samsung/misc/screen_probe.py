@@ -0,0 +1,246 @@
+"""
+Confirm TV screen changes by polling cheap signals instead of sleeping blind.
+
+A screen only counts as confirmed when a captured frame matches the reference
+regions recorded for it. Frames come from TV_FRAME_SOURCE: an HTTP URL or a
+command (ffmpeg on an HDMI capture device) returning one PPM frame. The TV REST
+app status only says the app is up front, not which of its screens is shown, so
+without a frame reference the old fixed delay is kept and the screen is
+reported as unconfirmed.
+
+Record the references once per screen from a frame showing it:
+
+    python misc/screen_probe.py record otp_form --region 660,300,600,80 --region 860,420,200,400
+"""
+import argparse
+import json
+import os
+import shlex
+import subprocess
+import time
+
+import requests
+
+REFERENCES_DIR = os.environ.get(
+    "TV_SCREEN_REFERENCES",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "screens")
+)
+
+
+class ScreenStateTimeout(Exception):
+    """Raised when an expected screen did not show up in time"""
+
+    def __init__(self, screen, elapsed, last_observation):
+        self.screen = screen
+        self.elapsed = elapsed
+        self.last_observation = last_observation
+        super().__init__(f"Screen '{screen}' not confirmed after {elapsed:.1f}s, "
+                         f"last observation: {last_observation}")
+
+
+def poll_until(check, timeout, interval=0.25):
+    """Call check until it returns (True, observation), returns (confirmed, elapsed, observation)"""
+    started = time.perf_counter()
+    observation = None
+    while True:
+        try:
+            confirmed, observation = check()
+        except Exception as e:
+            confirmed, observation = False, f"probe error: {e}"
+        elapsed = time.perf_counter() - started
+        if confirmed:
+            return True, elapsed, observation
+        if elapsed >= timeout:
+            return False, elapsed, observation
+        time.sleep(interval)
+
+
+class AppStatusProbe:
+    """Ask the TV REST API whether an app is running and visible"""
+
+    def __init__(self, host, app_id, port=8001, timeout=2):
+        self.url = f"http://{host}:{port}/api/v2/applications/{app_id}"
+        self.timeout = timeout
+        self.session = requests.Session()  # Keep-alive, a probe is one small GET
+
+    def status(self):
+        response = self.session.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def check_visible(self):
+        status = self.status()
+        return bool(status.get("running") and status.get("visible")), status
+
+
+def parse_ppm(data):
+    """(width, height, rgb_bytes) of a binary 8 bit PPM (P6), the format ffmpeg's ppm encoder writes"""
+    fields = []
+    pos = 0
+    while len(fields) < 4:
+        while data[pos:pos + 1].isspace():
+            pos += 1
+        if data[pos:pos + 1] == b"#":
+            pos = data.index(b"\n", pos) + 1
+            continue
+        end = pos
+        while end < len(data) and not data[end:end + 1].isspace():
+            end += 1
+        fields.append(data[pos:end])
+        pos = end
+    pos += 1  # One whitespace byte separates the header from the raster
+    if fields[0] != b"P6" or int(fields[3]) > 255:
+        raise ValueError("Only 8 bit binary PPM (P6) frames are supported")
+    width, height = int(fields[1]), int(fields[2])
+    pixels = data[pos:pos + width * height * 3]
+    if len(pixels) < width * height * 3:
+        raise ValueError("Truncated PPM frame")
+    return width, height, pixels
+
+
+class FrameGrabber:
+    """Grab one PPM frame from an HTTP URL or by running a command, e.g.
+
+    ffmpeg -loglevel error -f v4l2 -i /dev/video0 -frames:v 1 -f image2pipe -vcodec ppm -
+    """
+
+    def __init__(self, source, timeout=10):
+        self.source = source
+        self.timeout = timeout
+        self.session = requests.Session() if source.startswith(("http://", "https://")) else None
+
+    def __call__(self):
+        if self.session:
+            response = self.session.get(self.source, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.content
+        else:
+            data = subprocess.run(shlex.split(self.source), check=True, capture_output=True,
+                                  timeout=self.timeout).stdout
+        return parse_ppm(data)
+
+
+class FrameProbe:
+    """Compare regions of a captured frame against the reference of a screen.
+
+    grab_frame returns (width, height, rgb_bytes). A reference file
+    <references_dir>/<screen>.json holds regions as {x, y, w, h, rgb} with the
+    mean colour expected in each region, plus an optional tolerance.
+    """
+
+    def __init__(self, grab_frame, references_dir=REFERENCES_DIR, step=4):
+        self.grab_frame = grab_frame
+        self.references_dir = references_dir
+        self.step = step  # Sample every step-th pixel, enough for flat UI regions
+
+    def reference(self, screen):
+        path = os.path.join(self.references_dir, f"{screen}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _region_mean(self, width, pixels, region):
+        totals = [0, 0, 0]
+        count = 0
+        for y in range(region["y"], region["y"] + region["h"], self.step):
+            row = y * width * 3
+            for x in range(region["x"], region["x"] + region["w"], self.step):
+                offset = row + x * 3
+                totals[0] += pixels[offset]
+                totals[1] += pixels[offset + 1]
+                totals[2] += pixels[offset + 2]
+                count += 1
+        return [t / count for t in totals] if count else totals
+
+    def check(self, screen):
+        reference = self.reference(screen)
+        width, _, pixels = self.grab_frame()
+        tolerance = reference.get("tolerance", 20)
+        worst = 0.0
+        for region in reference["regions"]:
+            mean = self._region_mean(width, pixels, region)
+            worst = max(worst, max(abs(m - r) for m, r in zip(mean, region["rgb"])))
+        return worst <= tolerance, {"max_region_diff": round(worst, 1)}
+
+    def record_reference(self, screen, regions, tolerance=20):
+        """Store the current frame's region colours as the reference of a screen"""
+        width, _, pixels = self.grab_frame()
+        stored = [dict(region, rgb=[round(v, 1) for v in self._region_mean(width, pixels, region)])
+                  for region in regions]
+        os.makedirs(self.references_dir, exist_ok=True)
+        with open(os.path.join(self.references_dir, f"{screen}.json"), "w") as f:
+            json.dump({"regions": stored, "tolerance": tolerance}, f, indent=2)
+
+
+class ScreenStateProbe:
+    """Wait for a screen using the best signal available for it"""
+
+    def __init__(self, host, app_id=None, frame_probe=None, fallback_delay=5, rest_port=8001):
+        self.app_probe = AppStatusProbe(host, app_id, port=rest_port) if app_id else None
+        self.frame_probe = frame_probe
+        self.fallback_delay = fallback_delay
+        self.waits = {}  # screen -> seconds actually waited
+        self.unconfirmed = []  # Screens only waited for with the fixed delay
+
+    @classmethod
+    def for_session(cls, session, **kwargs):
+        """Probe for the TV behind a TVSession, app id from HOT_TV_APP_ID, frames from TV_FRAME_SOURCE"""
+        # Real TVs serve REST on 8001 next to the 8002 WebSocket, emulators on the same port
+        rest_port = 8001 if session.port in (8001, 8002) else session.port
+        if "frame_probe" not in kwargs and os.environ.get("TV_FRAME_SOURCE"):
+            kwargs["frame_probe"] = FrameProbe(FrameGrabber(os.environ["TV_FRAME_SOURCE"]),
+                                               references_dir=os.environ.get("TV_SCREEN_REFERENCES", REFERENCES_DIR))
+        return cls(session.host, app_id=os.environ.get("HOT_TV_APP_ID"), rest_port=rest_port, **kwargs)
+
+    def wait_for_screen(self, screen, timeout=15, interval=0.25):
+        """Block until screen is confirmed, raise ScreenStateTimeout otherwise"""
+        if self.frame_probe and self.frame_probe.reference(screen):
+            confirmed, elapsed, observation = poll_until(
+                lambda: self.frame_probe.check(screen), timeout, interval)
+            self.waits[screen] = round(elapsed, 3)
+            if not confirmed:
+                raise ScreenStateTimeout(screen, elapsed, observation)
+            print(f"Screen '{screen}' confirmed after {elapsed:.2f}s")
+            return elapsed
+
+        # No frame reference: a visible app is required, but which screen it shows is unknown
+        elapsed = 0.0
+        if self.app_probe:
+            visible, elapsed, observation = poll_until(self.app_probe.check_visible, timeout, interval)
+            if not visible:
+                self.waits[screen] = round(elapsed, 3)
+                raise ScreenStateTimeout(screen, elapsed, observation)
+        print(f"Screen '{screen}' unconfirmed (no frame reference), waiting {self.fallback_delay}s")
+        time.sleep(self.fallback_delay)
+        elapsed += self.fallback_delay
+        self.unconfirmed.append(screen)
+        self.waits[screen] = round(elapsed, 3)
+        return elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record or check TV screen references from captured frames")
+    parser.add_argument("command", choices=["record", "check"])
+    parser.add_argument("screen", help="Screen name, e.g. phone_form, otp_form, logged_in")
+    parser.add_argument("--source", default=os.environ.get("TV_FRAME_SOURCE"),
+                        help="Frame URL or command printing a PPM frame (default: TV_FRAME_SOURCE)")
+    parser.add_argument("--references", default=REFERENCES_DIR, help="Reference directory")
+    parser.add_argument("--region", action="append", default=[], metavar="X,Y,W,H",
+                        help="Region to record, repeat for several")
+    parser.add_argument("--tolerance", type=float, default=20, help="Max mean colour difference per region")
+
+    args = parser.parse_args()
+    if not args.source:
+        parser.error("--source or TV_FRAME_SOURCE is required")
+    probe = FrameProbe(FrameGrabber(args.source), references_dir=args.references)
+    if args.command == "record":
+        if not args.region:
+            parser.error("record needs at least one --region")
+        regions = [dict(zip("xywh", (int(v) for v in region.split(",")))) for region in args.region]
+        probe.record_reference(args.screen, regions, args.tolerance)
+        print(f"Recorded {len(regions)} regions for {args.screen} in {args.references}")
+    else:
+        if not probe.reference(args.screen):
+            parser.error(f"No reference for {args.screen} in {args.references}")
+        print(probe.check(args.screen))
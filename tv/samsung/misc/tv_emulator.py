@@ -0,0 +1,254 @@
+"""
+Local stand-in for a Samsung TV speaking the samsungtvws remote-control
+WebSocket protocol, so TV flows and key throughput can be exercised on any
+Linux box without a TV on the lab LAN.
+
+It accepts pairing, records every key with a timestamp, moves focus over the
+on-screen keypad like the HOT app login forms do and keeps the digits that
+were submitted so a flow can be verified end to end.
+
+Submitting a form shows a loading screen for transition_delay seconds before
+the next screen, keys sent meanwhile are dropped like on the TV. The current
+screen is served as a PPM frame on /__frame, a flat colour per screen, so the
+screen probe can be run against it with references from write_references().
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http import HTTPStatus
+
+# The legacy server keeps the process_request(path, headers) hook across websockets versions
+from websockets.legacy.server import serve
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from misc.keypad import KeypadPlanner, MOVES
+
+HOT_APP_ID = "hot.emulated"
+FRAME_PATH = "/__frame"
+FRAME_SIZE = (160, 90)
+# Screens in login order, each drawn as one flat colour
+SCREENS = ("phone_form", "otp_form", "logged_in")
+SCREEN_COLOURS = {
+    "phone_form": (30, 60, 160),
+    "otp_form": (30, 140, 70),
+    "logged_in": (200, 200, 200),
+    "loading": (0, 0, 0),
+}
+
+
+class TVEmulator:
+    """Emulated TV serving the remote-control channel and the REST app status"""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, pairing_latency=0.0,
+                 forms=(10, 6), app_id=HOT_APP_ID, transition_delay=0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency  # Delay before a received key takes effect
+        self.pairing_latency = pairing_latency
+        self.forms = forms  # Digits per keypad form, after the last digit focus is on submit
+        self.app_id = app_id
+        self.transition_delay = transition_delay  # Loading screen time after a submit
+        self.planner = KeypadPlanner()
+        self.keys = []  # (timestamp, key)
+        self.dropped_keys = []  # (timestamp, key) sent while the loading screen was up
+        self.screen = SCREENS[0]
+        self.submitted = []
+        self.connections = 0
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self._reset_form(0)
+
+    def _reset_form(self, index):
+        self.form_index = index
+        self.focus = self.planner.start
+        self.entry = ""
+        self.screen = SCREENS[min(index, len(SCREENS) - 1)]
+
+    def _on_key(self, key):
+        """Apply a key to the keypad focus model"""
+        if self.screen == "loading":
+            self.dropped_keys.append((time.time(), key))
+            return
+        if self.form_index >= len(self.forms):
+            return  # Logged in, no keypad on screen any more
+        on_submit = len(self.entry) >= self.forms[self.form_index]
+        if key in MOVES and not on_submit:
+            self.focus = self.planner.neighbour(self.focus, key) or self.focus
+        elif key == "KEY_ENTER":
+            if on_submit:
+                self.submitted.append(self.entry)
+                if self.transition_delay:
+                    self.screen = "loading"
+                    self.loop.call_later(self.transition_delay, self._reset_form, self.form_index + 1)
+                else:
+                    self._reset_form(self.form_index + 1)
+            else:
+                self.entry += self.focus
+
+    def frame(self, screen=None):
+        """PPM frame of a screen, the current one by default"""
+        width, height = FRAME_SIZE
+        pixel = bytes(SCREEN_COLOURS[screen or self.screen])
+        return f"P6\n{width} {height}\n255\n".encode() + pixel * (width * height)
+
+    def write_references(self, references_dir, tolerance=20):
+        """Screen probe references for the emulated screens, one centre region each"""
+        from misc.screen_probe import FrameProbe
+        width, height = FRAME_SIZE
+        region = {"x": width // 4, "y": height // 4, "w": width // 2, "h": height // 2}
+        for screen in SCREENS:
+            probe = FrameProbe(lambda: (width, height, self.frame(screen)[-width * height * 3:]),
+                               references_dir=references_dir)
+            probe.record_reference(screen, [region], tolerance)
+        return references_dir
+
+    @property
+    def frame_url(self):
+        return f"http://{self.host}:{self.port}{FRAME_PATH}"
+
+    async def _process_request(self, path, request_headers):
+        """Answer the REST app status probe and the frame grabber on the same port as the WebSocket"""
+        if path.startswith("/api/v2/applications/"):
+            # Visible on every screen, like the real app, it doesn't tell the login screens apart
+            app_id = path.rsplit("/", 1)[1]
+            status = {"id": app_id, "name": "HOT", "running": app_id == self.app_id,
+                      "visible": app_id == self.app_id, "version": "emulated"}
+            return HTTPStatus.OK, [("Content-Type", "application/json")], json.dumps(status).encode()
+        if path == FRAME_PATH:
+            return HTTPStatus.OK, [("Content-Type", "image/x-portable-pixmap")], self.frame()
+        return None
+
+    async def _handle(self, websocket):
+        if "samsung.remote.control" not in websocket.path:
+            await websocket.close(code=1008, reason="unknown channel")
+            return
+
+        self.connections += 1
+        await asyncio.sleep(self.pairing_latency)
+        await websocket.send(json.dumps({
+            "event": "ms.channel.connect",
+            "data": {"id": f"emulated-{self.connections}", "clients": [], "token": "12345678"},
+        }))
+
+        async for message in websocket:
+            payload = json.loads(message)
+            if payload.get("method") != "ms.remote.control":
+                continue
+            key = payload["params"]["DataOfCmd"]
+            self.keys.append((time.time(), key))
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            self._on_key(key)
+
+    async def _serve(self):
+        self.server = await serve(
+            self._handle, self.host, self.port, process_request=self._process_request)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    def start(self):
+        """Run the emulator on a background event loop"""
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self._serve(), self.loop).result(timeout=10)
+        print(f"TV emulator listening on ws://{self.host}:{self.port}")
+        return self
+
+    def stop(self):
+        """Shut the emulator down"""
+        async def shutdown():
+            self.server.close()
+            await self.server.wait_closed()
+
+        if self.server:
+            asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result(timeout=10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def verify(self, expected):
+        """Check the submitted forms, returns a list of mismatch descriptions"""
+        problems = []
+        for index, value in enumerate(expected):
+            got = self.submitted[index] if index < len(self.submitted) else None
+            if got != value:
+                problems.append(f"form {index}: expected {value!r}, got {got!r}")
+        return problems
+
+    def key_rate(self):
+        """Keys per second between the first and last received key"""
+        if len(self.keys) < 2:
+            return 0.0
+        return (len(self.keys) - 1) / (self.keys[-1][0] - self.keys[0][0])
+
+
+def benchmark(keys=200, latency=0.0):
+    """Measure key throughput and OTP entry time through a TVSession against the emulator"""
+    from misc.keypad import KeyPacer
+    from misc.tv_session import open_session, get_session, close_session
+
+    results = {}
+    with TVEmulator(latency=latency) as emulator:
+        started = time.perf_counter()
+        handle = open_session(emulator.host, port=emulator.port)
+        results["connect_s"] = time.perf_counter() - started
+        session = get_session(handle)
+        try:
+            started = time.perf_counter()
+            for _ in range(keys):
+                session.send_key("KEY_UP")
+            results["acked_keys_per_s"] = keys / (time.perf_counter() - started)
+
+            started = time.perf_counter()
+            session.send_keys(["KEY_UP"] * keys)
+            results["pipelined_keys_per_s"] = keys / (time.perf_counter() - started)
+
+            emulator._reset_form(0)
+            pacer = KeyPacer(session)
+            started = time.perf_counter()
+            pacer.type_digits(emulator.planner, "0523244358")
+            pacer.send(["KEY_ENTER"])
+            pacer.type_digits(emulator.planner, "123456")
+            pacer.send(["KEY_ENTER"])
+            results["otp_entry_s"] = time.perf_counter() - started
+            results["verify"] = emulator.verify(["0523244358", "123456"]) or "ok"
+        finally:
+            close_session(handle)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Emulated Samsung TV for offline flow tests")
+    parser.add_argument("--port", type=int, default=8001, help="Port to listen on")
+    parser.add_argument("--latency", type=float, default=0.0, help="Per-key response latency in seconds")
+    parser.add_argument("--transition-delay", type=float, default=0.0,
+                        help="Loading screen seconds after a form submit, keys meanwhile are dropped")
+    parser.add_argument("--bench", type=int, metavar="KEYS",
+                        help="Run the key throughput benchmark with this many keys and exit")
+
+    args = parser.parse_args()
+
+    if args.bench:
+        for name, value in benchmark(keys=args.bench, latency=args.latency).items():
+            print(f"{name}: {value if isinstance(value, str) else round(value, 3)}")
+    else:
+        emulator = TVEmulator(host="0.0.0.0", port=args.port, latency=args.latency,
+                              transition_delay=args.transition_delay).start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            emulator.stop()
+            print(f"Received {len(emulator.keys)} keys, submitted forms: {emulator.submitted}, "
+                  f"dropped {len(emulator.dropped_keys)} keys during transitions")
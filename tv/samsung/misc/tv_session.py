@@ -0,0 +1,161 @@
+"""
+Long-lived Samsung TV remote sessions shared across Prefect tasks.
+
+Each session owns one samsungtvws async WebSocket on a background event loop.
+Tasks pass around a plain string handle instead of the connection object, so
+one flow run pays the pairing and connection cost once.
+"""
+import asyncio
+import os
+import threading
+
+from samsungtvws.async_remote import SamsungTVWSAsyncRemote
+from samsungtvws.remote import SendRemoteKey
+
+TOKEN_DIR = os.environ.get(
+    "SAMSUNG_TV_TOKEN_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tokens")
+)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+class TVSession:
+    """Own the WebSocket to one TV and send keys over it from any thread"""
+
+    def __init__(self, host, port=8002, name="HotTests", timeout=10, reconnect_attempts=3):
+        self.host = host
+        self.port = port
+        self.name = name
+        self.timeout = timeout
+        self.reconnect_attempts = reconnect_attempts
+        self.token_file = os.path.join(TOKEN_DIR, f"{host}_{port}.token")
+        self.remote = None
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.queue = None
+        self.sender = None
+        self.keys_sent = 0
+        self.reconnects = 0
+
+    def _run(self, coro):
+        """Run a coroutine on the session loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def open(self):
+        """Start the session loop and connect, pairing with the TV on first use"""
+        os.makedirs(TOKEN_DIR, exist_ok=True)
+        self.thread.start()
+        self._run(self._start())
+        print(f"TV session opened to {self.host}:{self.port}")
+        return self
+
+    async def _start(self):
+        self.queue = asyncio.Queue()
+        await self._connect()
+        self.sender = asyncio.ensure_future(self._send_loop())
+
+    async def _connect(self):
+        self.remote = SamsungTVWSAsyncRemote(
+            host=self.host,
+            port=self.port,
+            token_file=self.token_file,
+            timeout=self.timeout,
+            name=self.name,
+            key_press_delay=0,  # Pacing between keys is up to the caller, not a fixed 1s
+        )
+        await self.remote.start_listening()
+
+    async def _reconnect(self):
+        """Drop the current connection and open a new one with the stored token"""
+        self.reconnects += 1
+        print(f"Reconnecting to TV {self.host}:{self.port}")
+        try:
+            await self.remote.close()
+        except Exception:
+            pass
+        await self._connect()
+
+    async def _send_loop(self):
+        """Send queued keys in order, the future of a key resolves once it is on the wire"""
+        while True:
+            key, future = await self.queue.get()
+            for attempt in range(self.reconnect_attempts + 1):
+                try:
+                    await self.remote.send_command(SendRemoteKey.click(key))
+                    self.keys_sent += 1
+                    if not future.done():
+                        future.set_result(key)
+                    break
+                except Exception as e:
+                    if attempt == self.reconnect_attempts:
+                        if not future.done():
+                            future.set_exception(e)
+                        break
+                    try:
+                        await self._reconnect()
+                    except Exception as reconnect_error:
+                        print(f"Reconnect failed: {reconnect_error}")
+                        await asyncio.sleep(0.5 * (attempt + 1))
+
+    def _enqueue(self, key):
+        """Queue a key from any thread, returns a concurrent future for its acknowledgement"""
+        async def send():
+            future = self.loop.create_future()
+            self.queue.put_nowait((key, future))
+            return await future
+
+        return asyncio.run_coroutine_threadsafe(send(), self.loop)
+
+    def send_key(self, key):
+        """Send one key and wait until it has been sent, same call as the sync remote"""
+        return self._enqueue(key).result(timeout=self.timeout * (self.reconnect_attempts + 1))
+
+    def send_keys(self, keys):
+        """Pipeline several keys, only waiting for all acknowledgements at the end"""
+        futures = [self._enqueue(key) for key in keys]
+        return [f.result(timeout=self.timeout * (self.reconnect_attempts + 1)) for f in futures]
+
+    def close(self):
+        """Close the WebSocket and stop the session loop"""
+        async def shutdown():
+            if self.sender:
+                self.sender.cancel()
+            if self.remote:
+                await self.remote.close()
+
+        if self.thread.is_alive():
+            try:
+                self._run(shutdown())
+            finally:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self.thread.join(timeout=5)
+        print(f"TV session to {self.host}:{self.port} closed "
+              f"({self.keys_sent} keys, {self.reconnects} reconnects)")
+
+
+def open_session(host, port=8002, **kwargs):
+    """Open a session to a TV, or reuse the open one, and return its handle"""
+    handle = f"{host}:{port}"
+    with _sessions_lock:
+        if handle not in _sessions:
+            _sessions[handle] = TVSession(host, port=port, **kwargs).open()
+    return handle
+
+
+def get_session(handle):
+    """Look up an open session by handle"""
+    with _sessions_lock:
+        try:
+            return _sessions[handle]
+        except KeyError:
+            raise KeyError(f"No open TV session for {handle}") from None
+
+
+def close_session(handle):
+    """Close a session and forget its handle"""
+    with _sessions_lock:
+        session = _sessions.pop(handle, None)
+    if session:
+        session.close()
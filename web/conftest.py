@@ -1,4 +1,15 @@
+import os
+import time
 import pytest
+from playwright.sync_api import Playwright
+
+from e2e.mobile.login.pom import login_user
+from e2e.utils.auth_state import AuthStateCache
+from e2e.utils.browser_pool import ContextPool
+from e2e.utils.routing import RequestRouter, AssetCache
+
+# Duration-balanced --shard-index/--shard-count selection, see e2e/utils/sharding.py
+pytest_plugins = ["e2e.utils.sharding"]
 
 # No device-specific configuration in conftest.py as each test handles its own device emulation
 
@@ -9,3 +20,46 @@ import pytest
 #         **browser_type_launch_args,
 #         "headless": False,  # Set to True for CI/production runs
 #     }
+
+
+def pytest_addoption(parser):
+    parser.addoption("--route-assets", action="store_true",
+                     default=os.environ.get("HOT_E2E_ROUTING") == "1",
+                     help="Block third-party/media requests and serve site statics from the local cache")
+
+
+@pytest.fixture(scope="session")
+def request_router(pytestconfig):
+    """Shared request router when --route-assets is on, otherwise None"""
+    if not pytestconfig.getoption("--route-assets"):
+        yield None
+        return
+    router = RequestRouter(AssetCache(),
+                           revalidate_after=float(os.environ.get("HOT_E2E_ASSET_MAX_AGE", "3600")))
+    yield router
+    router.cache.save()
+    print(f"Request routing totals: {router.totals}")
+
+
+@pytest.fixture(scope="session")
+def context_pool(playwright: Playwright):
+    """One WebKit browser per session (per worker under xdist) with pre-warmed iPhone 13 contexts"""
+    started = time.perf_counter()
+    browser = playwright.webkit.launch(headless=True)
+    launch_s = time.perf_counter() - started
+
+    pool = ContextPool(browser, playwright.devices['iPhone 13'],
+                       size=int(os.environ.get("HOT_E2E_CONTEXT_POOL", "2")))
+    pool.launch_s = launch_s
+    yield pool
+
+    pool.close()
+    browser.close()
+
+
+@pytest.fixture(scope="session")
+def auth_state_cache():
+    """Logged in storage states shared by the authenticated_page fixtures"""
+    cache = AuthStateCache(login_user)
+    yield cache
+    print(f"Auth state cache: {cache.stats}")
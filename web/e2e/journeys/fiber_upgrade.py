@@ -0,0 +1,48 @@
+import os
+import pytest
+
+from ..utils.journey import ActionRegistry, JourneyGraph, JourneyRunner
+from ..utils.metrics import TestMetrics
+
+GRAPH_PATH = os.path.join(os.path.dirname(__file__), "fiber_upgrade.json")
+# Personalized link from the upgrade SMS of the test customer
+UPGRADE_URL = os.environ.get("HOT_FIBER_UPGRADE_URL")
+
+# Edge actions of the graph, paths behind an action that isn't registered yet are skipped
+ACTIONS = ActionRegistry()
+
+
+@ACTIONS.register()
+def open_sms_link(page):
+    page.goto(UPGRADE_URL)
+
+
+def test_fiber_upgrade_journeys(context_pool, request_router):
+    if not UPGRADE_URL:
+        pytest.skip("HOT_FIBER_UPGRADE_URL is not set")
+
+    def open_page(storage_state=None):
+        # Forks get a fresh context carrying the cookies and storage of the snapshot
+        if storage_state:
+            context, page = context_pool.acquire(storage_state=storage_state)
+        else:
+            context, page = context_pool.acquire()
+        if request_router:
+            request_router.attach(context)
+        return context, page
+
+    metrics = TestMetrics(test_name="hot_fiber_upgrade_journeys")
+    runner = JourneyRunner(JourneyGraph.from_file(GRAPH_PATH), ACTIONS, open_page, context_pool.release,
+                           metrics=metrics)
+    try:
+        results = runner.run()
+    finally:
+        # Report the run also when opening a page or the walk itself blew up
+        metrics.finish()
+
+    counts = {status: sum(r["status"] == status for r in results) for status in ("passed", "failed", "skipped")}
+    print(f"Fiber upgrade journeys: {counts}, {runner.stats}")
+    failed = [f"{' > '.join(r['path'])}: {r['reason']}" for r in results if r["status"] == "failed"]
+    assert not failed, "\n".join(failed)
+    if not counts["passed"]:
+        pytest.skip(f"No journey path has all its actions registered yet ({counts['skipped']} skipped)")
@@ -0,0 +1,82 @@
+import copy
+
+from ..utils.journey import ActionRegistry, JourneyGraph, JourneyRunner, build_trie, plan
+
+# Small journey with a forkable fork (menu) and a server side one (confirm) whose
+# branches have to go back to the menu snapshot and replay the edges in between
+GRAPH = {
+    "name": "runner_walk",
+    "start": "start",
+    "nodes": {
+        "start": {}, "login": {}, "menu": {}, "offer_a": {}, "offer_b": {},
+        "confirm": {"forkable": False}, "done_sms": {}, "done_mail": {}, "cancel": {},
+    },
+    "edges": [
+        {"from": "start", "to": "login", "action": "visit", "params": {"screen": "login"}},
+        {"from": "login", "to": "menu", "action": "visit", "params": {"screen": "menu"}},
+        {"from": "menu", "to": "offer_a", "action": "visit", "params": {"screen": "offer_a"}},
+        {"from": "menu", "to": "offer_b", "action": "visit", "params": {"screen": "offer_b"}},
+        {"from": "offer_a", "to": "confirm", "action": "visit", "params": {"screen": "confirm"}},
+        {"from": "confirm", "to": "done_sms", "action": "visit", "params": {"screen": "done_sms"}},
+        {"from": "confirm", "to": "done_mail", "action": "visit", "params": {"screen": "done_mail"}},
+        {"from": "offer_b", "to": "cancel", "action": "visit", "params": {"screen": "cancel"}},
+    ],
+}
+
+
+class FakeContext:
+    def __init__(self, storage_state):
+        self.state = copy.deepcopy(storage_state) if storage_state else {"visited": []}
+
+    def storage_state(self):
+        return copy.deepcopy(self.state)
+
+
+class FakePage:
+    """What the runner uses of a Playwright page: its context's storage state, url and goto"""
+
+    def __init__(self, storage_state=None):
+        self.context = FakeContext(storage_state)
+        self.url = "about:blank"
+
+    def goto(self, url):
+        self.url = url
+
+
+def test_journey_runner_walks_trie_once():
+    calls = []  # (screen, url and visited screens of the page when the action ran)
+    actions = ActionRegistry()
+
+    @actions.register()
+    def visit(page, screen):
+        calls.append((screen, page.url, list(page.context.state["visited"])))
+        page.context.state["visited"].append(screen)
+        page.url = f"https://www.hot.net.il/{screen}"
+
+    opened, closed = [], []
+
+    def open_page(storage_state=None):
+        page = FakePage(storage_state)
+        opened.append(storage_state)
+        return page.context, page
+
+    graph = JourneyGraph(GRAPH["name"], GRAPH["start"], GRAPH["nodes"], GRAPH["edges"])
+    runner = JourneyRunner(graph, actions, open_page, closed.append)
+    results = runner.run()
+
+    assert sorted(r["path"][-1] for r in results if r["status"] == "passed") == ["cancel", "done_mail", "done_sms"]
+    # Every trie edge runs exactly once, only the edges between the menu and confirm are replayed
+    trie_edges = build_trie(graph.paths()).size()
+    assert runner.stats["edges_run"] == trie_edges == plan(graph)["edges_with_trie"] == 8
+    assert runner.stats["edges_replayed"] == 2
+    assert runner.stats["forks"] == 2
+    assert len(opened) == len(closed) == 3
+
+    first_run = {}
+    for screen, url, visited in calls:
+        first_run.setdefault(screen, (url, visited))
+    # Forked branches start from the menu snapshot: its storage state and URL, nothing of the sibling branch
+    assert first_run["offer_b"] == ("https://www.hot.net.il/menu", ["login", "menu"])
+    assert opened[1]["visited"] == opened[2]["visited"] == ["login", "menu"]
+    # Below the server side fork the replay rebuilt the state up to confirm before taking the other branch
+    assert ("done_mail", "https://www.hot.net.il/confirm", ["login", "menu", "offer_a", "confirm"]) in calls
@@ -1,73 +1,88 @@
+import os
+import uuid
+
 from .pom import *
 from ...utils.metrics import TestMetrics
+from ...utils.proxy_trace import CORRELATION_HEADER, ProxyTraceHook
+from ...utils.web_perf import StepPerfRecorder
 
 # Test function using the modular steps with metrics
 def test_hot_mobile_login_invalid_otp(page):
-    # Create metrics collector with unique UUID
-    metrics = TestMetrics(test_name="hot_mobile_login_invalid_otp")
-    # Step 1: Navigate to HOT website with metrics
-    metrics.start_step("navigate_to_hot_website")
+    # Create metrics collector with unique UUID, web timings are attached to every step
+    perf = StepPerfRecorder(page)
+    hooks = [perf]
+    # Running behind the mac proxy: attribute each step to tunnel, direct and client time
+    if os.environ.get("HOT_PROXY_TRACE_URL"):
+        # Tag this test's requests so concurrent tests behind the same proxy don't mix
+        correlation_id = f"hot_mobile_login_invalid_otp-{uuid.uuid4().hex[:12]}"
+        page.context.set_extra_http_headers({CORRELATION_HEADER: correlation_id})
+        hooks.append(ProxyTraceHook(correlation_id=correlation_id))
+    metrics = TestMetrics(test_name="hot_mobile_login_invalid_otp", hooks=hooks)
     try:
-        navigate_to_hot_website(page)
-        metrics.end_step("navigate_to_hot_website", status="success")
-    except Exception as e:
-        metrics.end_step("navigate_to_hot_website", status="failure", data={"error": str(e)})
-        raise
+        # Step 1: Navigate to HOT website with metrics
+        metrics.start_step("navigate_to_hot_website")
+        try:
+            navigate_to_hot_website(page)
+            metrics.end_step("navigate_to_hot_website", status="success")
+        except Exception as e:
+            metrics.end_step("navigate_to_hot_website", status="failure", data={"error": str(e)})
+            raise
     
-    # Step 2: Navigate to login page with metrics
-    metrics.start_step("navigate_to_login_page")
-    try:
-        navigate_to_login_page(page)
-        metrics.end_step("navigate_to_login_page", status="success")
-    except Exception as e:
-        metrics.end_step("navigate_to_login_page", status="failure", data={"error": str(e)})
-        raise
+        # Step 2: Navigate to login page with metrics
+        metrics.start_step("navigate_to_login_page")
+        try:
+            navigate_to_login_page(page)
+            metrics.end_step("navigate_to_login_page", status="success")
+        except Exception as e:
+            metrics.end_step("navigate_to_login_page", status="failure", data={"error": str(e)})
+            raise
     
-    # Step 3: Fill credentials and request SMS with metrics
-    metrics.start_step("enter_credentials")
-    try:
-        enter_credentials_and_request_sms(page, "301196085", "0528214946")
-        metrics.end_step("enter_credentials", status="success", 
-                       data={"id_used": "301196xxx", "phone": "052821xxxx"})
-    except Exception as e:
-        metrics.end_step("enter_credentials", status="failure", data={"error": str(e)})
-        raise
+        # Step 3: Fill credentials and request SMS with metrics
+        metrics.start_step("enter_credentials")
+        try:
+            waits = enter_credentials_and_request_sms(page, "301196085", "0528214946")
+            metrics.end_step("enter_credentials", status="success", 
+                           data={"id_used": "301196xxx", "phone": "052821xxxx", **waits})
+        except Exception as e:
+            metrics.end_step("enter_credentials", status="failure", data={"error": str(e)})
+            raise
     
-    # Step 4: Enter invalid OTP with metrics
-    metrics.start_step("enter_otp")
-    try:
-        enter_otp_code(page, "123123")
-        metrics.end_step("enter_otp", status="success", data={"otp": "123123"})
-    except Exception as e:
-        metrics.end_step("enter_otp", status="failure", data={"error": str(e)})
-        raise
+        # Step 4: Enter invalid OTP with metrics
+        metrics.start_step("enter_otp")
+        try:
+            enter_otp_code(page, "123123")
+            metrics.end_step("enter_otp", status="success", data={"otp": "123123"})
+        except Exception as e:
+            metrics.end_step("enter_otp", status="failure", data={"error": str(e)})
+            raise
     
-    # Step 5: Submit login and check for error with metrics
-    metrics.start_step("submit_login")
-    try:
-        submit_otp_login(page)
-        metrics.end_step("submit_login", status="success")
-    except Exception as e:
-        metrics.end_step("submit_login", status="failure", data={"error": str(e)})
-        raise
+        # Step 5: Submit login and check for error with metrics
+        metrics.start_step("submit_login")
+        try:
+            waits = submit_otp_login(page)
+            metrics.end_step("submit_login", status="success", data=waits)
+        except Exception as e:
+            metrics.end_step("submit_login", status="failure", data={"error": str(e)})
+            raise
     
-    # Verify error message is displayed with metrics
-    metrics.start_step("verify_error_message")
-    try:
-        # Approach 1: Use a CSS selector targeting the stable class name
-        error_message = page.locator("div.errorComment")
-        expect(error_message).to_be_visible()
+        # Verify error message is displayed with metrics
+        metrics.start_step("verify_error_message")
+        try:
+            # Approach 1: Use a CSS selector targeting the stable class name
+            error_message = page.locator(OTP_ERROR_SELECTOR)
+            expect(error_message).to_be_visible()
         
-        # Approach 2: Use partial text matching which is more resilient
-        expect(page.get_by_text("יש להכניס את הקוד", exact=False)).to_be_visible()
+            # Approach 2: Use partial text matching which is more resilient
+            expect(page.get_by_text("יש להכניס את הקוד", exact=False)).to_be_visible()
         
-        # Record success with the actual error text
-        error_text = error_message.inner_text()
-        metrics.end_step("verify_error_message", status="success", 
-                      data={"error_text": error_text})
-    except Exception as e:
-        metrics.end_step("verify_error_message", status="failure", data={"error": str(e)})
-        raise
-    
-    # Complete the test metrics and record overall results
-    metrics.finish()
\ No newline at end of file
+            # Record success with the actual error text
+            error_text = error_message.inner_text()
+            metrics.end_step("verify_error_message", status="success", 
+                          data={"error_text": error_text})
+        except Exception as e:
+            metrics.end_step("verify_error_message", status="failure", data={"error": str(e)})
+            raise
+    finally:
+        # Complete the test metrics and record overall results, also when a step failed
+        perf.close()
+        metrics.finish()
@@ -1,25 +1,107 @@
+import os
+import re
 import pytest
-from playwright.sync_api import Playwright, Page, expect
-from time import sleep
+from contextlib import contextmanager
+from playwright.sync_api import Page, Response, expect
+from time import perf_counter
+
+from ...utils.auth_state import AuthStateCache, default_user
+from ...utils.browser_pool import ContextPool, FixtureTimer
+
+# Backend calls whose timing the login steps record when one shows up, the steps themselves end
+# on what the page shows. Only POSTs to the site's own hosts count, set the env vars to the
+# SMS-send and OTP-validate paths to time exactly those calls
+SMS_REQUEST_URL = re.compile(os.environ.get("HOT_SMS_REQUEST_URL", r"(?i)^https://([\w-]+\.)*hot\.net\.il/"))
+OTP_VALIDATION_URL = re.compile(os.environ.get("HOT_OTP_VALIDATION_URL", r"(?i)^https://([\w-]+\.)*hot\.net\.il/"))
+
+# Message the OTP form shows for a wrong or missing code
+OTP_ERROR_SELECTOR = "div.errorComment"
+OTP_FORM_TEXT = "הזינו כאן את הקוד וסיימנו"
 
 # We're using the TestJourney class approach from the test file, not decorators
 # from ...utils.metrics import TestJourney
 
 
 @pytest.fixture(scope="function")
-def page(playwright: Playwright):
-    # Using iPhone 13 device descriptor for consistent mobile testing
-    iphone_13 = playwright.devices['iPhone 13']
-    browser = playwright.webkit.launch(headless=True)
-    context = browser.new_context(**iphone_13)
-    page = context.new_page()
+def page(context_pool: ContextPool, request_router, request):
+    # iPhone 13 context from the session pool, the browser is launched once per session
+    timer = FixtureTimer(launch_s=context_pool.take_launch_time())
+    context, page = context_pool.acquire()
+    routing_stats = request_router.attach(context) if request_router else None
+    timer.setup_done()
     
     # Return the page for testing
     yield page
     
-    # Clean up after test
-    context.close()
-    browser.close()
+    # Clean up after test, the context is closed and replaced so nothing leaks into the next test
+    context_pool.release(context)
+    _report_fixture(request, timer, routing_stats)
+
+@pytest.fixture(scope="function")
+def authenticated_page(context_pool: ContextPool, request_router, auth_state_cache: AuthStateCache, request):
+    # Starts logged in from the cached storage state, parametrize indirectly with a user dict for another user
+    user = getattr(request, "param", None) or default_user()
+    timer = FixtureTimer(launch_s=context_pool.take_launch_time())
+    context, page = auth_state_cache.authenticated_context(user, context_pool)
+    login_redirect = auth_state_cache.watch_login_redirect(page)
+    routing_stats = request_router.attach(context) if request_router else None
+    timer.setup_done()
+    
+    yield page
+    
+    context_pool.release(context)
+    if login_redirect["url"]:
+        # The site logged the cached state out, replace it so the next test starts logged in
+        print(f"{request.node.name} was redirected to {login_redirect['url']}, renewing the login")
+        auth_state_cache.renew(user, context_pool)
+    _report_fixture(request, timer, routing_stats)
+
+def _report_fixture(request, timer: FixtureTimer, routing_stats: dict = None):
+    """Attach the fixture timings and routing stats to the test report"""
+    timings = timer.report()
+    for name, value in timings.items():
+        request.node.user_properties.append((name, value))
+    print(f"Timings for {request.node.name}: {timings}")
+    if routing_stats is not None:
+        request.node.user_properties.append(("routing", routing_stats))
+        print(f"Routing for {request.node.name}: {routing_stats}")
+
+@contextmanager
+def _timed_wait(waits: dict, name: str):
+    """Record how long the wrapped wait really took, in seconds"""
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        waits[name] = round(perf_counter() - started, 3)
+
+@contextmanager
+def _watch_response(page: Page, pattern: re.Pattern, waits: dict, name: str):
+    """Record when the first API POST matching pattern is answered, without waiting for one.
+
+    The SMS and OTP calls aren't guaranteed, e.g. the form may reject an OTP
+    client-side, so only <name>_s and <name>_status are added when one shows up.
+    """
+    started = perf_counter()
+    predicate = _is_api_post(pattern)
+
+    def on_response(response: Response):
+        if f"{name}_status" not in waits and predicate(response):
+            waits[f"{name}_s"] = round(perf_counter() - started, 3)
+            waits[f"{name}_status"] = response.status
+    page.on("response", on_response)
+    try:
+        yield
+    finally:
+        page.remove_listener("response", on_response)
+
+def _is_api_post(pattern: re.Pattern):
+    """Predicate for the XHR/fetch POST whose URL matches pattern"""
+    def predicate(response: Response) -> bool:
+        request = response.request
+        return (request.method == "POST" and request.resource_type in ("xhr", "fetch")
+                and bool(pattern.search(response.url)))
+    return predicate
 
 # Step 1: Navigate to HOT website and open mobile menu
 def navigate_to_hot_website(page: Page):
@@ -36,8 +118,9 @@ def navigate_to_login_page(page: Page):
         has_text="התחברות לאזור האישי").click()
     
 # Step 3: Enter credentials and request SMS
-def enter_credentials_and_request_sms(page: Page, id_number: str, phone_number: str):
-    """Fill in login form and request SMS verification code"""
+def enter_credentials_and_request_sms(page: Page, id_number: str, phone_number: str) -> dict:
+    """Fill in login form and request SMS verification code, returns the measured waits"""
+    waits = {}
     # Enter ID and phone number
     page.get_by_role("textbox", name="תעודת זהות").click()
     page.get_by_role("textbox", name="תעודת זהות").fill(id_number)
@@ -45,26 +128,58 @@ def enter_credentials_and_request_sms(page: Page, id_number: str, phone_number:
     page.get_by_role("textbox", name="טלפון נייד").fill(phone_number)
     
     # Wait for form to be fully interactive
-    sleep(2)
-    
-    # Request OTP SMS with reliable selector
-    page.locator("div.pageSubmit > button[type='submit']").click(force=True, timeout=5000)
+    submit = page.locator("div.pageSubmit > button[type='submit']")
+    with _timed_wait(waits, "wait_form_ready_s"):
+        expect(submit).to_be_enabled()
     
-    # Wait for SMS to be processed
-    sleep(5)
+    # Request OTP SMS with reliable selector, the step is done once the OTP form shows up
+    with _watch_response(page, SMS_REQUEST_URL, waits, "wait_sms_response"):
+        with _timed_wait(waits, "wait_otp_form_s"):
+            submit.click(force=True, timeout=5000)
+            expect(page.get_by_text(OTP_FORM_TEXT)).to_be_visible(timeout=15000)
+    return waits
 
 # Step 4: Enter OTP code
 def enter_otp_code(page: Page, otp_code: str):
     """Enter the OTP code into the verification form"""
     # Click on the OTP input field instruction text
-    page.get_by_text("הזינו כאן את הקוד וסיימנו").click()
+    page.get_by_text(OTP_FORM_TEXT).click()
     
     # Enter the OTP code
     page.get_by_label("", exact=True).click()
     page.get_by_label("", exact=True).fill(otp_code)
 
 # Step 5: Submit login form with OTP
-def submit_otp_login(page: Page):
-    """Click the login button to submit the OTP form"""
-    page.get_by_role("button", name="כניסה לחשבון", exact=True).click()
-    sleep(2)  # Wait for response
\ No newline at end of file
+def submit_otp_login(page: Page) -> dict:
+    """Click the login button to submit the OTP form, returns the measured waits.
+
+    Done once the form shows its error or the page leaves the login form,
+    otp_error_shown tells which of the two happened.
+    """
+    waits = {}
+    login_url = page.url
+    with _watch_response(page, OTP_VALIDATION_URL, waits, "wait_otp_validation"):
+        with _timed_wait(waits, "wait_otp_outcome_s"):
+            page.get_by_role("button", name="כניסה לחשבון", exact=True).click()
+            page.wait_for_function(
+                """([selector, url]) => {
+                    const error = document.querySelector(selector);
+                    return (error && error.getClientRects().length > 0) || location.href !== url;
+                }""",
+                arg=[OTP_ERROR_SELECTOR, login_url], timeout=15000)
+    waits["otp_error_shown"] = page.locator(OTP_ERROR_SELECTOR).first.is_visible()
+    return waits
+
+# Full login, used once per test user by the auth state cache
+def login_user(page: Page, user: dict):
+    """Log in with the user's ID, phone and OTP through the mobile login form"""
+    navigate_to_hot_website(page)
+    navigate_to_login_page(page)
+    enter_credentials_and_request_sms(page, user["id_number"], user["phone"])
+    enter_otp_code(page, user["otp"])
+    waits = submit_otp_login(page)
+    if waits["otp_error_shown"]:
+        raise RuntimeError(f"OTP rejected: {page.locator(OTP_ERROR_SELECTOR).first.inner_text()}")
+    if waits.get("wait_otp_validation_status", 0) >= 400:
+        raise RuntimeError(f"OTP validation answered {waits['wait_otp_validation_status']}")
+    page.wait_for_load_state("networkidle")
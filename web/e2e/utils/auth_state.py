@@ -0,0 +1,184 @@
+import fcntl
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from playwright.sync_api import BrowserContext, Page
+
+from .browser_pool import ContextPool
+from .routing import SITE_DOMAINS, matches_domain
+
+# Session cookies live here, keep it out of the results dir that gets uploaded
+AUTH_DIR = os.environ.get(
+    "HOT_E2E_AUTH_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "hot-e2e", "auth")
+)
+ENVIRONMENT = os.environ.get("HOT_E2E_ENV", "prod")
+MAX_AGE = float(os.environ.get("HOT_E2E_AUTH_MAX_AGE", "1800"))
+# Page only a logged in user can see, checked with a plain request when set
+PROBE_URL = os.environ.get("HOT_E2E_AUTH_PROBE_URL")
+
+
+def default_user() -> dict:
+    """Test user from HOT_E2E_USER_ID / HOT_E2E_USER_PHONE / HOT_E2E_USER_OTP"""
+    return {
+        "id_number": os.environ.get("HOT_E2E_USER_ID", ""),
+        "phone": os.environ.get("HOT_E2E_USER_PHONE", ""),
+        "otp": os.environ.get("HOT_E2E_USER_OTP", ""),
+    }
+
+
+def _user_key(user: dict) -> str:
+    # Hashed so ID and phone numbers don't end up in file names
+    return hashlib.sha256(f"{user['id_number']}:{user['phone']}".encode()).hexdigest()[:16]
+
+
+class AuthStateCache:
+    """Logged in storage state (cookies and localStorage) per test user and environment.
+
+    login(page, user) performs the full login in a fresh page. A cached state
+    is used until it reaches max_age or one of its site cookies expires; with
+    a probe URL it is also checked once per process with a request that
+    doesn't render anything. Without one, watch_login_redirect() flags a page
+    the site sent back to its login page, and renew() replaces the rejected
+    state so the next test starts logged in again.
+    """
+
+    def __init__(self, login, directory: str = AUTH_DIR, environment: str = ENVIRONMENT,
+                 max_age: float = MAX_AGE, probe_url: str = PROBE_URL, site_domains=SITE_DOMAINS):
+        self.login = login
+        self.directory = directory
+        self.environment = environment
+        self.max_age = max_age
+        self.probe_url = probe_url
+        self.site_domains = tuple(site_domains)
+        self.probed = set()  # User keys whose state passed the probe in this process
+        self.used = {}  # User key -> saved_at of the state handed out last
+        self.stats = {"hits": 0, "logins": 0, "invalidated": 0}
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    def _path(self, user: dict) -> str:
+        return os.path.join(self.directory, f"{self.environment}_{_user_key(user)}.json")
+
+    @contextmanager
+    def _lock(self, user: dict):
+        """Only one process (shard) logs a user in at a time"""
+        with open(self._path(user) + ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self, user: dict):
+        try:
+            with open(self._path(user)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, user: dict, storage_state: dict):
+        now = time.time()
+        entry = {"saved_at": now, "expires_at": min([now + self.max_age] + self._cookie_expiries(storage_state)),
+                 "storage_state": storage_state}
+        path = self._path(user)
+        tmp_path = path + ".tmp"
+        with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+        return now
+
+    def _cookie_expiries(self, storage_state: dict) -> list:
+        # Session cookies have expires -1, they last as long as the context
+        return [cookie["expires"] for cookie in storage_state.get("cookies", [])
+                if cookie.get("expires", -1) > 0
+                and matches_domain(cookie["domain"].lstrip("."), self.site_domains)]
+
+    def _probe(self, context: BrowserContext) -> bool:
+        response = context.request.get(self.probe_url, timeout=10000)
+        return response.ok and not self.is_login_url(response.url)
+
+    def is_login_url(self, url: str) -> bool:
+        """Whether url is a login page of the site, where a logged out user gets redirected"""
+        parsed = urlparse(url)
+        return (matches_domain(parsed.hostname or "", self.site_domains)
+                and "login" in parsed.path.lower())
+
+    def watch_login_redirect(self, page: Page) -> dict:
+        """Record the first main frame navigation of page to a login page under "url" of the returned dict"""
+        seen = {"url": None}
+
+        def on_navigated(frame):
+            if seen["url"] is None and frame == page.main_frame and self.is_login_url(frame.url):
+                seen["url"] = frame.url
+        page.on("framenavigated", on_navigated)
+        return seen
+
+    def is_fresh(self, entry) -> bool:
+        return bool(entry) and time.time() < entry["expires_at"]
+
+    def get(self, user: dict, pool: ContextPool) -> dict:
+        """Storage state of a logged in user, logging in only when the cached one is unusable"""
+        entry = self._load(user)
+        if not self.is_fresh(entry):
+            with self._lock(user):
+                entry = self._load(user)  # Another shard may have just logged in
+                if not self.is_fresh(entry):
+                    return self.refresh(user, pool)
+        self.stats["hits"] += 1
+        self.used[_user_key(user)] = entry["saved_at"]
+        return entry["storage_state"]
+
+    def refresh(self, user: dict, pool: ContextPool) -> dict:
+        started = time.perf_counter()
+        context, page = pool.acquire()
+        try:
+            self.login(page, user)
+            storage_state = context.storage_state()
+        finally:
+            pool.release(context)
+        self.used[_user_key(user)] = self._save(user, storage_state)
+        self.probed.add(_user_key(user))
+        self.stats["logins"] += 1
+        print(f"Logged in test user {_user_key(user)} in {time.perf_counter() - started:.1f}s")
+        return storage_state
+
+    def renew(self, user: dict, pool: ContextPool) -> dict:
+        """Replace the state handed out last after the site rejected it, once across all shards"""
+        key = _user_key(user)
+        with self._lock(user):
+            # Re-read under the lock, another shard may already have replaced the rejected state
+            entry = self._load(user)
+            if self.is_fresh(entry) and entry["saved_at"] != self.used.get(key):
+                self.used[key] = entry["saved_at"]
+                self.probed.add(key)
+                return entry["storage_state"]
+            self.invalidate(user)
+            return self.refresh(user, pool)
+
+    def invalidate(self, user: dict):
+        self.probed.discard(_user_key(user))
+        try:
+            os.remove(self._path(user))
+            self.stats["invalidated"] += 1
+        except FileNotFoundError:
+            pass
+
+    def authenticated_context(self, user: dict, pool: ContextPool):
+        """New (context, page) starting logged in, the state is probed once per process"""
+        context, page = pool.acquire(storage_state=self.get(user, pool))
+        key = _user_key(user)
+        if self.probe_url and key not in self.probed:
+            valid = False
+            try:
+                valid = self._probe(context)
+            except Exception as e:
+                print(f"Auth probe for {key} failed: {e}")
+            if not valid:
+                context.close()
+                context, page = pool.acquire(storage_state=self.renew(user, pool))
+            self.probed.add(key)
+        return context, page
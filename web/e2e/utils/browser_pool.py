@@ -0,0 +1,74 @@
+import time
+from playwright.sync_api import Browser, BrowserContext, Page
+
+
+class ContextPool:
+    """Pre-warmed browser contexts handed out one per test.
+
+    Contexts are never reused across tests: a released context is closed and
+    replaced by a fresh one, so each test still starts from a clean cookie
+    jar, storage and cache while the browser itself stays up for the session.
+    """
+
+    def __init__(self, browser: Browser, context_options: dict, size: int = 2):
+        self.browser = browser
+        self.context_options = context_options
+        self.size = size
+        self.idle = []  # (context, page) ready to hand out
+        self.launch_s = 0.0  # Set by whoever launched the browser
+        self.fill()
+
+    def take_launch_time(self) -> float:
+        """Browser launch time, charged to the first test that asks for it only"""
+        launch_s, self.launch_s = self.launch_s, 0.0
+        return launch_s
+
+    def _new_context(self, **overrides):
+        context = self.browser.new_context(**{**self.context_options, **overrides})
+        # Opening the first page is part of the warm-up, tests get it ready to use
+        return context, context.new_page()
+
+    def fill(self):
+        """Top the pool back up to its size"""
+        while len(self.idle) < self.size:
+            self.idle.append(self._new_context())
+
+    def acquire(self, **overrides) -> tuple[BrowserContext, Page]:
+        """Take a context and its page, a fresh one when options differ from the pool's"""
+        if overrides:
+            return self._new_context(**overrides)
+        if not self.idle:
+            self.fill()
+        return self.idle.pop()
+
+    def release(self, context: BrowserContext):
+        """Close a used context and warm a replacement for the next test"""
+        context.close()
+        self.fill()
+
+    def close(self):
+        for context, _ in self.idle:
+            context.close()
+        self.idle = []
+
+
+class FixtureTimer:
+    """Split a test's wall time into browser launch, context setup and test body"""
+
+    def __init__(self, launch_s: float = 0.0):
+        self.launch_s = launch_s
+        self.started = time.perf_counter()
+        self.setup_s = 0.0
+        self.test_started = None
+
+    def setup_done(self):
+        self.setup_s = time.perf_counter() - self.started
+        self.test_started = time.perf_counter()
+
+    def report(self) -> dict:
+        test_s = time.perf_counter() - self.test_started if self.test_started else 0.0
+        return {
+            "browser_launch_s": round(self.launch_s, 3),
+            "context_setup_s": round(self.setup_s, 3),
+            "test_s": round(test_s, 3),
+        }
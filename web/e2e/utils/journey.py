@@ -0,0 +1,250 @@
+"""Run every path of a journey graph while executing shared prefixes only once.
+
+A journey is a JSON graph (see e2e/journeys/fiber_upgrade.json): nodes are
+screens or server side steps, edges carry the name of the action that moves
+the browser from one node to the next. Paths from the start node to the
+terminal nodes are merged into a prefix trie and the trie is walked depth
+first: the first branch below a fork continues in the same page, the others
+start from a snapshot (cookies and local storage plus the URL) taken at the
+fork, or at the nearest forkable node above it with the edges in between
+replayed. A full run costs about the number of trie edges instead of
+paths x depth.
+
+    python -m e2e.utils.journey e2e/journeys/fiber_upgrade.json --plan
+"""
+import argparse
+import importlib
+import json
+import time
+
+
+class ActionRegistry(dict):
+    """Action name -> callable(page, **params), filled with the register decorator"""
+
+    def register(self, name: str = None):
+        def decorator(fn):
+            self[name or fn.__name__] = fn
+            return fn
+        return decorator
+
+
+class JourneyGraph:
+    def __init__(self, name: str, start: str, nodes: dict, edges: list):
+        self.name = name
+        self.start = start
+        self.nodes = nodes
+        self.edges = edges
+        self.outgoing = {node_id: [] for node_id in nodes}
+        for index, edge in enumerate(edges):
+            if edge["from"] not in nodes or edge["to"] not in nodes:
+                raise ValueError(f"Edge {edge['from']} -> {edge['to']} references an unknown node")
+            self.outgoing[edge["from"]].append(index)
+
+    @classmethod
+    def from_file(cls, path: str) -> "JourneyGraph":
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["name"], data["start"], data["nodes"], data["edges"])
+
+    def forkable(self, node_id: str) -> bool:
+        """False for nodes whose state lives on the server, forks go back to an earlier snapshot"""
+        return self.nodes[node_id].get("forkable", True)
+
+    def paths(self, max_revisits: int = 1) -> list:
+        """All start to terminal paths as tuples of edge indices, a loop is taken at most max_revisits times"""
+        paths = []
+        visits = {}
+
+        def walk(node_id, path):
+            if not self.outgoing[node_id]:
+                paths.append(tuple(path))
+                return
+            for index in self.outgoing[node_id]:
+                target = self.edges[index]["to"]
+                if visits.get(target, 0) > max_revisits:
+                    continue
+                visits[target] = visits.get(target, 0) + 1
+                path.append(index)
+                walk(target, path)
+                path.pop()
+                visits[target] -= 1
+
+        visits[self.start] = 1
+        walk(self.start, [])
+        return paths
+
+    def node_path(self, path: tuple) -> list:
+        return [self.start] + [self.edges[index]["to"] for index in path]
+
+
+class _TrieNode:
+    __slots__ = ("edge", "children", "path")
+
+    def __init__(self, edge: int = None):
+        self.edge = edge
+        self.children = {}
+        self.path = None  # Set on the node that ends a full path
+
+    def leaves(self):
+        if self.path is not None:
+            yield self.path
+        for child in self.children.values():
+            yield from child.leaves()
+
+    def size(self) -> int:
+        """Number of edges below this node"""
+        return sum(1 + child.size() for child in self.children.values())
+
+
+def build_trie(paths: list) -> _TrieNode:
+    root = _TrieNode()
+    for path in paths:
+        node = root
+        for index in path:
+            node = node.children.setdefault(index, _TrieNode(index))
+        node.path = path
+    return root
+
+
+def plan(graph: JourneyGraph, actions: dict = None, max_revisits: int = 1) -> dict:
+    """Path count and cost of running them one by one vs through the trie"""
+    paths = graph.paths(max_revisits)
+    missing = sorted({edge["action"] for edge in graph.edges
+                      if edge.get("action") and actions is not None and edge["action"] not in actions})
+    return {
+        "paths": len(paths),
+        "edges_one_by_one": sum(len(path) for path in paths),
+        "edges_with_trie": build_trie(paths).size(),
+        "missing_actions": missing,
+    }
+
+
+class JourneyRunner:
+    """Walk the path trie of a graph with a browser.
+
+    open_page(storage_state=None) returns a new (context, page), close_page(context)
+    disposes of it. Paths behind an edge whose action isn't registered are skipped.
+    """
+
+    def __init__(self, graph: JourneyGraph, actions: dict, open_page, close_page,
+                 metrics=None, max_revisits: int = 1):
+        self.graph = graph
+        self.actions = actions
+        self.open_page = open_page
+        self.close_page = close_page
+        self.metrics = metrics
+        self.max_revisits = max_revisits
+        self.results = []
+        self.stats = {"edges_run": 0, "edges_replayed": 0, "forks": 0}
+
+    def run(self) -> list:
+        trie = build_trie(self.graph.paths(self.max_revisits))
+        started = time.perf_counter()
+        context, page = self.open_page()
+        try:
+            self._walk(trie, self.graph.start, page, None, [])
+        finally:
+            self.close_page(context)
+        self.stats["duration_s"] = round(time.perf_counter() - started, 3)
+        return self.results
+
+    def _finish(self, trie: _TrieNode, status: str, reason: str = None):
+        for path in trie.leaves():
+            self.results.append({"path": self.graph.node_path(path), "status": status, "reason": reason})
+
+    def _execute(self, index: int, page, replay: bool = False):
+        edge = self.graph.edges[index]
+        action = edge.get("action")
+        if not action:
+            return
+        step = f"{edge['from']}->{edge['to']}"
+        if self.metrics:
+            self.metrics.start_step(step)
+        try:
+            self.actions[action](page, **edge.get("params", {}))
+        except Exception as e:
+            if self.metrics:
+                self.metrics.end_step(step, status="failure", data={"error": str(e), "replay": replay})
+            raise
+        if self.metrics:
+            self.metrics.end_step(step, status="success", data={"replay": replay})
+        self.stats["edges_replayed" if replay else "edges_run"] += 1
+
+    def _snapshot(self, page) -> dict:
+        return {"storage_state": page.context.storage_state(), "url": page.url}
+
+    def _restore(self, anchor: dict, since_anchor: list):
+        """New page in the state of the anchor snapshot plus the edges taken since"""
+        self.stats["forks"] += 1
+        context, page = self.open_page(storage_state=anchor["storage_state"] if anchor else None)
+        try:
+            if anchor and anchor["url"] != "about:blank":
+                page.goto(anchor["url"])
+            for index in since_anchor:
+                self._execute(index, page, replay=True)
+        except Exception:
+            self.close_page(context)
+            raise
+        return context, page
+
+    def _walk(self, trie: _TrieNode, node_id: str, page, anchor: dict, since_anchor: list):
+        if trie.path is not None:
+            self._finish(trie, "passed")
+            return
+
+        children = list(trie.children.values())
+        if len(children) > 1 and self.graph.forkable(node_id):
+            anchor, since_anchor = self._snapshot(page), []
+
+        page_used = False
+        for child in children:
+            edge = self.graph.edges[child.edge]
+            if edge.get("action") and edge["action"] not in self.actions:
+                self._finish(child, "skipped", f"no action registered for {edge['action']}")
+                continue
+
+            context = None
+            child_page = page
+            if page_used:
+                try:
+                    context, child_page = self._restore(anchor, since_anchor)
+                except Exception as e:
+                    self._finish(child, "failed", f"restoring {node_id} failed: {e}")
+                    continue
+            page_used = True
+
+            try:
+                self._execute(child.edge, child_page)
+            except Exception as e:
+                self._finish(child, "failed", f"{edge['from']} -> {edge['to']}: {e}")
+            else:
+                self._walk(child, edge["to"], child_page, anchor, since_anchor + [child.edge])
+            finally:
+                if context is not None:
+                    self.close_page(context)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect a journey graph")
+    parser.add_argument("graph", help="Journey graph JSON file")
+    parser.add_argument("--actions", help="Module with the ACTIONS registry, reports actions still missing")
+    parser.add_argument("--max-revisits", type=int, default=1)
+    parser.add_argument("--plan", action="store_true", help="Show path count and trie cost")
+    parser.add_argument("--paths", action="store_true", help="List every path")
+    args = parser.parse_args()
+
+    graph = JourneyGraph.from_file(args.graph)
+    actions = importlib.import_module(args.actions).ACTIONS if args.actions else None
+    if args.paths:
+        for path in graph.paths(args.max_revisits):
+            print(" > ".join(graph.node_path(path)))
+    if args.plan or not args.paths:
+        summary = plan(graph, actions, args.max_revisits)
+        print(f"{graph.name}: {summary['paths']} paths, {summary['edges_one_by_one']} edges run one by one, "
+              f"{summary['edges_with_trie']} with shared prefixes")
+        if summary["missing_actions"]:
+            print(f"Missing actions: {', '.join(summary['missing_actions'])}")
+
+
+if __name__ == "__main__":
+    main()
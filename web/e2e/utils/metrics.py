@@ -0,0 +1,264 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+from prometheus_client import CollectorRegistry, Gauge, pushadd_to_gateway
+
+# The results store lives at the repo root (on the path through pytest.ini), it isn't copied into the test image
+try:
+    from results_store import open_store
+except ImportError:
+    open_store = None
+
+PUSHGATEWAY_URL = os.environ.get("PUSHGATEWAY_URL", "prometheus-pushgateway.hot-e2e-tests.svc:9091")
+SPOOL_PATH = os.environ.get(
+    "HOT_E2E_METRICS_SPOOL",
+    os.path.join("hot-e2e-test-results", "metrics_spool.jsonl")
+)
+JOB_NAME = "hot_e2e_tests"
+
+
+class MetricsExporter:
+    """Ship metric records to the Pushgateway in batches from a background thread.
+
+    Tests only ever append to an in-memory queue. When the gateway can't be
+    reached the batch goes to a local JSONL spool instead, so exporting never
+    slows down or fails a test step.
+    """
+
+    def __init__(self, gateway=PUSHGATEWAY_URL, spool_path=SPOOL_PATH,
+                 batch_size=50, flush_interval=2.0, push_timeout=3.0):
+        self.gateway = gateway
+        self.spool_path = spool_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.push_timeout = push_timeout
+        self.queue = queue.Queue()
+        self.gateway_down_until = 0.0  # Skip straight to the spool for a while after a failure
+        self.store = open_store() if open_store else None
+        self.open_runs = {}  # run_id -> step records, stored once the test record arrives or on close
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def submit(self, record: dict):
+        self.queue.put(record)
+
+    def _run(self):
+        while True:
+            batch = []
+            try:
+                record = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if record is None:
+                return
+            batch.append(record)
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    record = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if record is None:
+                    stop = True
+                    break
+                batch.append(record)
+            self._export(batch)
+            if stop:
+                return
+
+    def _export(self, batch: list):
+        if self.store:
+            self._store(batch)
+        if self.gateway and time.monotonic() >= self.gateway_down_until:
+            try:
+                self._push(batch)
+                return
+            except Exception as e:
+                print(f"Pushgateway {self.gateway} unreachable ({e}), spooling {len(batch)} records")
+                self.gateway_down_until = time.monotonic() + 60
+        self._spool(batch)
+
+    def _push(self, batch: list):
+        """Push the batch, one Pushgateway group per test so runs don't overwrite each other"""
+        by_test = {}
+        for record in batch:
+            by_test.setdefault(record["test"], []).append(record)
+
+        for test_name, records in by_test.items():
+            registry = CollectorRegistry()
+            step_duration = Gauge("hot_e2e_step_duration_seconds", "Duration of a test step",
+                                  ["test", "step", "status"], registry=registry)
+            step_success = Gauge("hot_e2e_step_success", "1 if the step succeeded",
+                                 ["test", "step"], registry=registry)
+            test_duration = Gauge("hot_e2e_test_duration_seconds", "Duration of the whole test",
+                                  ["test", "status"], registry=registry)
+            test_timestamp = Gauge("hot_e2e_test_last_run_timestamp", "When the test last finished",
+                                   ["test"], registry=registry)
+            step_perf = Gauge("hot_e2e_step_web_perf", "Web performance value measured during a step",
+                              ["test", "step", "metric"], registry=registry)
+            for record in records:
+                if record["type"] == "step":
+                    step_duration.labels(test_name, record["step"], record["status"]).set(record["duration_s"])
+                    step_success.labels(test_name, record["step"]).set(record["status"] == "success")
+                    for metric, value in record.get("perf", {}).items():
+                        if isinstance(value, (int, float)) and not isinstance(value, bool):
+                            step_perf.labels(test_name, record["step"], metric).set(value)
+                else:
+                    test_duration.labels(test_name, record["status"]).set(record["duration_s"])
+                    test_timestamp.labels(test_name).set(record["timestamp"])
+            pushadd_to_gateway(self.gateway, job=JOB_NAME, registry=registry,
+                               grouping_key={"test": test_name}, timeout=self.push_timeout)
+
+    def _store(self, batch: list):
+        """Write finished test runs to the local results store"""
+        for record in batch:
+            if record["type"] == "step":
+                self.open_runs.setdefault(record["run_id"], []).append(record)
+                continue
+            steps = self.open_runs.pop(record["run_id"], [])
+            self._write_run({
+                "run_id": record["run_id"],
+                "source": "web",
+                "name": record["test"],
+                "device": None,
+                "started_at": record["timestamp"] - record["duration_s"],
+                "finished_at": record["timestamp"],
+                "status": record["status"],
+                "metadata": {"steps": record["steps"]},
+            }, steps)
+
+    def _store_unfinished(self):
+        """Write runs whose test record never came, the test died before finish(), as failures"""
+        for run_id, steps in self.open_runs.items():
+            self._write_run({
+                "run_id": run_id,
+                "source": "web",
+                "name": steps[0]["test"],
+                "device": None,
+                "started_at": steps[0]["timestamp"] - steps[0]["duration_s"],
+                "finished_at": steps[-1]["timestamp"],
+                "status": "failure",
+                "metadata": {"steps": len(steps), "unfinished": True},
+            }, steps)
+        self.open_runs = {}
+
+    def _write_run(self, run: dict, steps: list):
+        try:
+            self.store.write_run(run, [{
+                "step": step["step"],
+                "timestamp": step["timestamp"],
+                "duration_s": step["duration_s"],
+                "status": step["status"],
+                "metrics": {**step["data"], "perf": step.get("perf", {})},
+            } for step in steps])
+        except Exception as e:
+            print(f"Could not store run {run['run_id']}: {e}")
+
+    def _spool(self, batch: list):
+        try:
+            os.makedirs(os.path.dirname(self.spool_path) or ".", exist_ok=True)
+            with open(self.spool_path, "a") as f:
+                for record in batch:
+                    f.write(json.dumps(record, default=str) + "\n")
+        except OSError as e:
+            print(f"Could not spool metrics: {e}")
+
+    def close(self, timeout: float = 10.0):
+        """Flush what is queued and store unfinished runs, called at interpreter exit"""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout=timeout)
+        if self.store and not self.thread.is_alive():
+            self._store_unfinished()
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter() -> MetricsExporter:
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = MetricsExporter()
+        return _exporter
+
+
+class TestMetrics:
+    """Collect step timings of one test run and hand them to the exporter.
+
+    Hooks are objects with on_step_start(step) and on_step_end(step, duration_s,
+    status) -> dict, the dict they return is attached to the step record.
+    """
+
+    __test__ = False  # Not a test class, despite the name
+
+    def __init__(self, test_name: str, exporter: MetricsExporter = None, hooks: list = None):
+        self.test_name = test_name
+        self.run_id = str(uuid.uuid4())
+        self.exporter = exporter or get_exporter()
+        self.hooks = hooks or []
+        self.started = time.perf_counter()
+        self.open_steps = {}
+        self.steps = []
+
+    def start_step(self, step: str):
+        for hook in self.hooks:
+            try:
+                hook.on_step_start(step)
+            except Exception as e:
+                print(f"Metrics hook {type(hook).__name__} failed on {step} start: {e}")
+        self.open_steps[step] = time.perf_counter()
+
+    def end_step(self, step: str, status: str = "success", data: dict = None) -> dict:
+        ended = time.perf_counter()
+        started = self.open_steps.pop(step, ended)
+        extra = {}
+        for hook in self.hooks:
+            try:
+                extra.update(hook.on_step_end(step, ended - started, status) or {})
+            except Exception as e:
+                print(f"Metrics hook {type(hook).__name__} failed on {step} end: {e}")
+        record = {
+            "type": "step",
+            "run_id": self.run_id,
+            "test": self.test_name,
+            "step": step,
+            "status": status,
+            "duration_s": round(ended - started, 4),
+            "timestamp": time.time(),
+            "data": data or {},
+            "perf": extra,
+        }
+        self.steps.append(record)
+        self._submit(record)
+        return record
+
+    def finish(self, status: str = None) -> dict:
+        if status is None:
+            status = "failure" if any(s["status"] != "success" for s in self.steps) else "success"
+        record = {
+            "type": "test",
+            "run_id": self.run_id,
+            "test": self.test_name,
+            "status": status,
+            "duration_s": round(time.perf_counter() - self.started, 4),
+            "timestamp": time.time(),
+            "steps": len(self.steps),
+        }
+        self._submit(record)
+        return record
+
+    def _submit(self, record: dict):
+        # Metrics must never fail a test step
+        try:
+            self.exporter.submit(record)
+        except Exception as e:
+            print(f"Dropping metrics record for {record.get('step', self.test_name)}: {e}")
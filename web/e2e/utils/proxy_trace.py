@@ -0,0 +1,104 @@
+import json
+import os
+import time
+import urllib.parse
+import urllib.request
+
+# Trace endpoint of infra/proxy/mac_proxy_server.py
+PROXY_TRACE_URL = os.environ.get("HOT_PROXY_TRACE_URL", "http://localhost:8000/__traces")
+# Request header the proxy keys traces by, see CORRELATION_HEADER in the proxy
+CORRELATION_HEADER = "X-Correlation-ID"
+
+
+def fetch_traces(since: float, correlation_id: str = None, url: str = PROXY_TRACE_URL,
+                 timeout: float = 2.0) -> list:
+    """Proxy traces still open or ended after since (epoch seconds)"""
+    params = {"since": f"{since:.3f}"}
+    if correlation_id:
+        params["correlation_id"] = correlation_id
+    with urllib.request.urlopen(f"{url}?{urllib.parse.urlencode(params)}", timeout=timeout) as response:
+        return json.load(response)
+
+
+def _busy_ms(intervals: list) -> float:
+    """Length of the union of (start, end) intervals in ms"""
+    total, current_start, current_end = 0.0, None, None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return round(total * 1000, 1)
+
+
+def attribute(traces: list, started_at: float, ended_at: float) -> dict:
+    """Split a step's wall time between network segments by the proxy traces in its window.
+
+    Per route (tunnel or direct) the connect, TTFB and transfer times are summed,
+    network_ms is the time at least one request was open and client_ms the rest
+    of the step, spent in the browser or the device.
+    """
+    now = time.time()
+    step_ms = (ended_at - started_at) * 1000
+    # Tunnel totals overlap their own exchanges, only the exchanges and plain requests count
+    parents = {t["parent"] for t in traces if t.get("parent")}
+    routes, intervals = {}, []
+    for trace in traces:
+        start = trace["started_at"]
+        end = trace["ended_at"] or now
+        if end < started_at or start > ended_at:
+            continue
+        route = routes.setdefault(trace["route"], {"requests": 0, "connect_ms": 0.0, "ttfb_ms": 0.0,
+                                                   "transfer_ms": 0.0, "bytes_down": 0, "errors": 0})
+        if trace["id"] in parents:
+            # Only the tunnel's connect time belongs to this step, and only if it opened in it
+            if start >= started_at:
+                route["connect_ms"] = round(route["connect_ms"] + (trace["connect_ms"] or 0.0), 1)
+            continue
+        intervals.append((max(start, started_at), min(end, ended_at)))
+        route["requests"] += 1
+        for key in ("connect_ms", "ttfb_ms", "transfer_ms"):
+            route[key] = round(route[key] + (trace[key] or 0.0), 1)
+        route["bytes_down"] += trace["bytes_down"]
+        route["errors"] += bool(trace["error"]) or (trace["status"] or 0) >= 500
+    network_ms = _busy_ms(intervals)
+    return {"routes": routes, "network_ms": network_ms, "client_ms": round(max(step_ms - network_ms, 0.0), 1)}
+
+
+class ProxyTraceHook:
+    """TestMetrics hook attaching the proxy's view of each step, stops asking once the proxy is unreachable.
+
+    With a correlation_id only the traces of requests tagged with it count. The
+    tag is only visible on plain HTTP requests, a step whose requests all went
+    through CONNECT tunnels falls back to every trace in its window and is
+    marked "correlated": False.
+    """
+
+    def __init__(self, correlation_id: str = None, url: str = PROXY_TRACE_URL):
+        self.correlation_id = correlation_id
+        self.url = url
+        self.enabled = True
+        self.step_starts = {}
+
+    def on_step_start(self, step: str):
+        self.step_starts[step] = time.time()
+
+    def on_step_end(self, step: str, duration_s: float, status: str) -> dict:
+        ended_at = time.time()
+        started_at = self.step_starts.pop(step, ended_at - duration_s)
+        if not self.enabled:
+            return {}
+        try:
+            traces = fetch_traces(started_at, self.correlation_id, self.url)
+            correlated = bool(traces) or not self.correlation_id
+            if not correlated:
+                traces = fetch_traces(started_at, url=self.url)
+        except OSError as e:
+            print(f"Proxy traces unavailable at {self.url} ({e}), not asking again")
+            self.enabled = False
+            return {}
+        return {"proxy": dict(attribute(traces, started_at, ended_at), correlated=correlated)}
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import time
+from urllib.parse import urlparse
+
+from playwright.sync_api import BrowserContext, Route, Request
+
+# Third parties the assertions never look at: analytics, tag managers, ads, chat widgets
+DEFAULT_BLOCKED_DOMAINS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "facebook.net",
+    "connect.facebook.com",
+    "hotjar.com",
+    "clarity.ms",
+    "taboola.com",
+    "outbrain.com",
+    "tiktok.com",
+    "glassboxdigital.io",
+    "zopim.com",
+    "zendesk.com",
+    "livechatinc.com",
+)
+DEFAULT_BLOCKED_TYPES = ("image", "media")
+CACHEABLE_TYPES = ("script", "stylesheet", "font")
+SITE_DOMAINS = ("hot.net.il",)
+
+CACHE_DIR = os.environ.get(
+    "HOT_E2E_ASSET_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "hot-e2e", "assets")
+)
+
+# Hop-by-hop or encoding headers that don't apply to a body we serve ourselves
+DROPPED_HEADERS = ("content-encoding", "content-length", "transfer-encoding", "connection")
+
+
+def matches_domain(host: str, domains) -> bool:
+    """Whether host is one of domains or a subdomain of one"""
+    return any(host == domain or host.endswith("." + domain) for domain in domains)
+
+
+class AssetCache:
+    """Content-addressed store of static responses: blobs by sha256, an index by URL"""
+
+    def __init__(self, directory: str = CACHE_DIR):
+        self.directory = directory
+        self.blob_dir = os.path.join(directory, "blobs")
+        self.index_path = os.path.join(directory, "index.json")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self.index = {}
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path) as f:
+                    self.index = json.load(f)
+            except ValueError:
+                self.index = {}  # Corrupt index only costs a refetch
+        self.dirty = False
+
+    def get(self, url: str):
+        """(entry, body) for a cached URL, or (None, None)"""
+        entry = self.index.get(url)
+        if not entry:
+            return None, None
+        try:
+            with open(os.path.join(self.blob_dir, entry["sha256"]), "rb") as f:
+                return entry, f.read()
+        except FileNotFoundError:
+            return None, None
+
+    def put(self, url: str, body: bytes, headers: dict):
+        sha = hashlib.sha256(body).hexdigest()
+        blob_path = os.path.join(self.blob_dir, sha)
+        if not os.path.exists(blob_path):
+            tmp_path = blob_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, blob_path)
+        self.index[url] = {
+            "sha256": sha,
+            "headers": {k: v for k, v in headers.items() if k.lower() not in DROPPED_HEADERS},
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "validated_at": time.time(),
+        }
+        self.dirty = True
+
+    def touch(self, url: str):
+        """Mark a cached URL as revalidated now"""
+        self.index[url]["validated_at"] = time.time()
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self.index_path)
+        self.dirty = False
+
+
+class RequestRouter:
+    """Route handler for a browser context: block noise, serve site statics from the cache"""
+
+    def __init__(self, cache: AssetCache = None, blocked_domains=DEFAULT_BLOCKED_DOMAINS,
+                 blocked_types=DEFAULT_BLOCKED_TYPES, site_domains=SITE_DOMAINS,
+                 revalidate_after: float = 3600):
+        self.cache = cache or AssetCache()
+        self.blocked_domains = tuple(blocked_domains)
+        self.blocked_types = tuple(blocked_types)
+        self.site_domains = tuple(site_domains)
+        self.revalidate_after = revalidate_after
+        self.totals = self._new_stats()
+
+    @staticmethod
+    def _new_stats() -> dict:
+        return {"blocked": 0, "served_from_cache": 0, "revalidated": 0, "cached": 0, "passed": 0}
+
+    def attach(self, context: BrowserContext) -> dict:
+        """Route all requests of context through the router, returns its own stats dict"""
+        stats = self._new_stats()
+        context.route("**/*", lambda route, request: self._handle(route, request, stats))
+        return stats
+
+    def _count(self, stats: dict, name: str):
+        stats[name] += 1
+        self.totals[name] += 1
+
+    def _handle(self, route: Route, request: Request, stats: dict):
+        host = urlparse(request.url).hostname or ""
+        if matches_domain(host, self.blocked_domains) or request.resource_type in self.blocked_types:
+            self._count(stats, "blocked")
+            route.abort("blockedbyclient")
+            return
+
+        if (request.method == "GET" and request.resource_type in CACHEABLE_TYPES
+                and matches_domain(host, self.site_domains)):
+            self._serve_static(route, request, stats)
+            return
+
+        self._count(stats, "passed")
+        route.continue_()
+
+    def _serve_static(self, route: Route, request: Request, stats: dict):
+        entry, body = self.cache.get(request.url)
+        if entry and time.time() - entry["validated_at"] < self.revalidate_after:
+            self._count(stats, "served_from_cache")
+            route.fulfill(status=200, headers=entry["headers"], body=body)
+            return
+
+        headers = dict(request.headers)
+        if entry and entry.get("etag"):
+            headers["if-none-match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["if-modified-since"] = entry["last_modified"]
+
+        try:
+            response = route.fetch(headers=headers)
+        except Exception:
+            # Network hiccup: a stale copy beats failing the page
+            if entry:
+                self._count(stats, "served_from_cache")
+                route.fulfill(status=200, headers=entry["headers"], body=body)
+            else:
+                route.abort("failed")
+            return
+
+        if response.status == 304 and entry:
+            self.cache.touch(request.url)
+            self._count(stats, "revalidated")
+            route.fulfill(status=200, headers=entry["headers"], body=body)
+            return
+
+        fresh_body = response.body()
+        if response.ok:
+            self.cache.put(request.url, fresh_body, response.headers)
+            self._count(stats, "cached")
+        else:
+            self._count(stats, "passed")
+        route.fulfill(response=response, body=fresh_body,
+                      headers={k: v for k, v in response.headers.items()
+                               if k.lower() not in DROPPED_HEADERS})
@@ -0,0 +1,204 @@
+"""Split the e2e suite into shards balanced by historical test durations.
+
+Used two ways:
+  * as a pytest plugin (registered in conftest.py): --shard-index/--shard-count,
+    or HOT_E2E_SHARD_COUNT plus the JOB_COMPLETION_INDEX of an indexed k8s Job,
+    keep only this shard's tests and record how long each test took.
+  * as a CLI: `python -m e2e.utils.sharding run -n 4 <pytest args>` runs the
+    shards as local processes and merges their reports, `merge` does the
+    merge step alone for shards that ran in separate pods.
+"""
+import argparse
+import glob
+import heapq
+import json
+import os
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+import pytest
+
+RESULTS_DIR = os.environ.get("HOT_E2E_RESULTS_DIR", "hot-e2e-test-results")
+DURATIONS_FILE = "durations.json"
+DEFAULT_DURATION = 30.0  # Seconds assumed for a test that never ran before
+
+
+def _durations_path(results_dir: str, shard_index: int = None) -> str:
+    if shard_index is None:
+        return os.path.join(results_dir, DURATIONS_FILE)
+    return os.path.join(results_dir, f"durations-shard{shard_index}.json")
+
+
+def load_durations(results_dir: str = RESULTS_DIR) -> dict:
+    try:
+        with open(_durations_path(results_dir)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def merge_durations(history: dict, fresh: dict, weight: float = 0.5) -> dict:
+    """Blend new durations into the history so one slow run doesn't swing the balance"""
+    merged = dict(history)
+    for nodeid, seconds in fresh.items():
+        merged[nodeid] = seconds if nodeid not in history else (
+            weight * seconds + (1 - weight) * history[nodeid])
+    return merged
+
+
+def assign_shards(nodeids: list, durations: dict, shard_count: int) -> list:
+    """Longest-processing-time-first assignment, returns one list of nodeids per shard"""
+    known = sorted(durations[n] for n in nodeids if n in durations)
+    default = known[len(known) // 2] if known else DEFAULT_DURATION
+    ordered = sorted(nodeids, key=lambda n: (-durations.get(n, default), n))
+
+    shards = [[] for _ in range(shard_count)]
+    loads = [(0.0, index) for index in range(shard_count)]
+    for nodeid in ordered:
+        load, index = heapq.heappop(loads)
+        shards[index].append(nodeid)
+        heapq.heappush(loads, (load + durations.get(nodeid, default), index))
+    return shards
+
+
+# pytest plugin
+
+def pytest_addoption(parser):
+    group = parser.getgroup("sharding")
+    group.addoption("--shard-index", type=int,
+                    default=int(os.environ.get("HOT_E2E_SHARD_INDEX",
+                                               os.environ.get("JOB_COMPLETION_INDEX", "0"))),
+                    help="Index of the shard to run (default: JOB_COMPLETION_INDEX)")
+    group.addoption("--shard-count", type=int,
+                    default=int(os.environ.get("HOT_E2E_SHARD_COUNT", "1")),
+                    help="Total number of shards")
+
+
+def pytest_collection_modifyitems(config, items):
+    shard_count = config.getoption("--shard-count")
+    if shard_count <= 1:
+        return
+    shard_index = config.getoption("--shard-index")
+    if not 0 <= shard_index < shard_count:
+        raise pytest.UsageError(f"--shard-index must be between 0 and {shard_count - 1} "
+                                f"for {shard_count} shards, got {shard_index}")
+    shards = assign_shards([item.nodeid for item in items], load_durations(), shard_count)
+    selected = set(shards[shard_index])
+
+    deselected = [item for item in items if item.nodeid not in selected]
+    items[:] = [item for item in items if item.nodeid in selected]
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+    print(f"\nShard {shard_index + 1}/{shard_count}: {len(items)} tests selected")
+
+
+_test_durations = {}  # nodeid -> setup + call + teardown seconds in this process
+
+
+def pytest_runtest_logreport(report):
+    _test_durations[report.nodeid] = _test_durations.get(report.nodeid, 0.0) + report.duration
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if not _test_durations:
+        return
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    if session.config.getoption("--shard-count") > 1:
+        # Shards may run at the same time, each writes its own file for the merge step
+        path = _durations_path(RESULTS_DIR, session.config.getoption("--shard-index"))
+        with open(path, "w") as f:
+            json.dump(_test_durations, f, indent=2)
+    else:
+        _write_durations(merge_durations(load_durations(), _test_durations))
+
+
+def _write_durations(durations: dict, results_dir: str = RESULTS_DIR):
+    path = _durations_path(results_dir)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(durations, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+# merging and local runner
+
+def merge_results(results_dir: str = RESULTS_DIR, output: str = "junit-merged.xml") -> dict:
+    """Merge shard junit reports into one and fold shard durations into the history"""
+    merged = ET.Element("testsuites")
+    totals = {"tests": 0, "failures": 0, "errors": 0, "skipped": 0, "time": 0.0}
+    for path in sorted(glob.glob(os.path.join(results_dir, "junit-shard*.xml"))):
+        root = ET.parse(path).getroot()
+        suites = [root] if root.tag == "testsuite" else list(root)
+        for suite in suites:
+            suite.set("name", f"{suite.get('name', 'pytest')}[{os.path.basename(path)[:-4]}]")
+            merged.append(suite)
+            for key in ("tests", "failures", "errors", "skipped"):
+                totals[key] += int(suite.get(key, 0))
+            totals["time"] = max(totals["time"], float(suite.get("time", 0.0)))
+    for key, value in totals.items():
+        merged.set(key, str(round(value, 3) if key == "time" else value))
+    ET.ElementTree(merged).write(os.path.join(results_dir, output), encoding="utf-8", xml_declaration=True)
+
+    history = load_durations(results_dir)
+    for path in glob.glob(os.path.join(results_dir, "durations-shard*.json")):
+        with open(path) as f:
+            history = merge_durations(history, json.load(f))
+        os.remove(path)
+    _write_durations(history, results_dir)
+
+    print(f"Merged report {os.path.join(results_dir, output)}: {totals['tests']} tests, "
+          f"{totals['failures']} failures, {totals['errors']} errors, wall {totals['time']}s")
+    return totals
+
+
+def run_local(workers: int, pytest_args: list) -> int:
+    """Run the suite as workers shard processes, then merge their reports"""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    for stale in glob.glob(os.path.join(RESULTS_DIR, "junit-shard*.xml")):
+        os.remove(stale)
+
+    started = time.perf_counter()
+    processes = [
+        subprocess.Popen([
+            sys.executable, "-m", "pytest", *pytest_args,
+            "--shard-index", str(index), "--shard-count", str(workers),
+            "--junitxml", os.path.join(RESULTS_DIR, f"junit-shard{index}.xml"),
+        ])
+        for index in range(workers)
+    ]
+    exit_codes = [process.wait() for process in processes]
+    print(f"{workers} shards finished in {time.perf_counter() - started:.1f}s, exit codes {exit_codes}")
+
+    merge_results()
+    # 5 means no tests collected, which is fine for a shard when there are few tests
+    failures = [code for code in exit_codes if code not in (0, 5)]
+    return failures[0] if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Duration-balanced sharding of the e2e suite")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="Run shards as local processes and merge the results, "
+                                                   "other arguments are passed to pytest")
+    run_parser.add_argument("-n", "--workers", type=int, default=os.cpu_count() or 2)
+    subparsers.add_parser("merge", help="Merge shard reports from separate pods")
+    plan_parser = subparsers.add_parser("plan", help="Show how the recorded tests would be split")
+    plan_parser.add_argument("--shards", type=int, default=4)
+
+    args, pytest_args = parser.parse_known_args()
+    if args.command == "run":
+        sys.exit(run_local(args.workers, pytest_args))
+    elif pytest_args:
+        parser.error(f"unrecognized arguments: {' '.join(pytest_args)}")
+    elif args.command == "merge":
+        merge_results()
+    else:
+        durations = load_durations()
+        for index, shard in enumerate(assign_shards(list(durations), durations, args.shards)):
+            print(f"shard {index}: {sum(durations[n] for n in shard):.1f}s, {len(shard)} tests")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import os
+import re
+import time
+
+from playwright.sync_api import Page
+
+TRACE_DIR = os.path.join(os.environ.get("HOT_E2E_RESULTS_DIR", "hot-e2e-test-results"), "traces")
+
+# Installed in every document of the context before the site's own scripts run.
+# Each observer is optional, WebKit doesn't expose all of these entry types.
+PERF_INIT_SCRIPT = """
+(() => {
+  const perf = window.__hotPerf = { lcp: null, cls: 0, inp: 0 };
+  const observe = (type, callback, options) => {
+    try {
+      new PerformanceObserver(list => list.getEntries().forEach(callback))
+        .observe(Object.assign({ type, buffered: true }, options || {}));
+    } catch (e) {}
+  };
+  observe('largest-contentful-paint', e => { perf.lcp = e.startTime; });
+  observe('layout-shift', e => { if (!e.hadRecentInput) perf.cls += e.value; });
+  observe('event', e => { if (e.interactionId) perf.inp = Math.max(perf.inp, e.duration); },
+          { durationThreshold: 16 });
+})();
+"""
+
+# Collects what happened in the document since `since` (a performance.now() value),
+# or since the document started when the step navigated to a new one
+COLLECT_SCRIPT = """
+([timeOrigin, since]) => {
+  const fresh = performance.timeOrigin !== timeOrigin;
+  const start = fresh ? 0 : since;
+  const resources = performance.getEntriesByType('resource').filter(r => r.startTime >= start);
+  const nav = fresh ? performance.getEntriesByType('navigation')[0] : null;
+  const perf = window.__hotPerf || {};
+  return {
+    navigated: fresh,
+    ttfb_ms: nav ? nav.responseStart : null,
+    dom_content_loaded_ms: nav ? nav.domContentLoadedEventEnd : null,
+    load_ms: nav && nav.loadEventEnd ? nav.loadEventEnd : null,
+    document_bytes: nav ? nav.transferSize : null,
+    resource_count: resources.length,
+    resource_bytes: resources.reduce((sum, r) => sum + (r.transferSize || 0), 0),
+    slowest_resource_ms: resources.reduce((max, r) => Math.max(max, r.duration), 0),
+    lcp_ms: perf.lcp,
+    cls: perf.cls,
+    inp_ms: perf.inp,
+  };
+}
+"""
+
+
+class StepPerfRecorder:
+    """TestMetrics hook collecting Navigation/Resource Timing and web vitals per step.
+
+    With latency budgets set, the context is traced and a step's trace chunk
+    is only written to disk when the step went over its budget.
+    """
+
+    def __init__(self, page: Page, budgets: dict = None, default_budget: float = None):
+        self.page = page
+        self.budgets = budgets or {}
+        self.default_budget = default_budget
+        if self.default_budget is None and os.environ.get("HOT_E2E_STEP_BUDGET"):
+            self.default_budget = float(os.environ["HOT_E2E_STEP_BUDGET"])
+        self.tracing = bool(self.budgets or self.default_budget)
+        self.requests = 0
+        self.step_marks = {}
+        self.chunk_open = False
+
+        page.context.add_init_script(PERF_INIT_SCRIPT)
+        page.on("request", self._on_request)
+        if self.tracing:
+            page.context.tracing.start(screenshots=True, snapshots=True)
+            self.chunk_open = True
+
+    def _on_request(self, request):
+        self.requests += 1
+
+    def _mark(self):
+        try:
+            return self.page.evaluate("[performance.timeOrigin, performance.now()]")
+        except Exception:
+            return [None, 0]  # No document yet, everything that follows counts
+
+    def on_step_start(self, step: str):
+        self.step_marks[step] = (self._mark(), self.requests)
+        if self.tracing and not self.chunk_open:
+            self.page.context.tracing.start_chunk(title=step)
+            self.chunk_open = True
+
+    def on_step_end(self, step: str, duration_s: float, status: str) -> dict:
+        mark, requests_before = self.step_marks.pop(step, ([None, 0], self.requests))
+        try:
+            perf = self.page.evaluate(COLLECT_SCRIPT, mark)
+        except Exception as e:
+            perf = {"error": str(e)}
+        perf["requests"] = self.requests - requests_before
+
+        if self.tracing and self.chunk_open:
+            budget = self.budgets.get(step, self.default_budget)
+            if budget is not None and duration_s > budget:
+                os.makedirs(TRACE_DIR, exist_ok=True)
+                safe_step = re.sub(r"[^\w.-]", "_", step)
+                path = os.path.join(TRACE_DIR, f"{safe_step}_{time.strftime('%Y%m%d_%H%M%S')}.zip")
+                self.page.context.tracing.stop_chunk(path=path)
+                perf["trace"] = path
+                perf["over_budget_s"] = round(duration_s - budget, 3)
+            else:
+                self.page.context.tracing.stop_chunk()
+            self.chunk_open = False
+        return perf
+
+    def close(self):
+        if self.tracing:
+            if self.chunk_open:
+                self.page.context.tracing.stop_chunk()
+                self.chunk_open = False
+            self.page.context.tracing.stop()